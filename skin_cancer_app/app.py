@@ -1,3 +1,9 @@
+# Optional startup profiling (SKINSCAN_PROFILE_STARTUP=1) must start before the heavy imports
+import os
+from utils import startup_profiler
+if os.environ.get("SKINSCAN_PROFILE_STARTUP"):
+    startup_profiler.install()
+
 # Set page configuration must come first, before any other st commands
 import streamlit as st
 st.set_page_config(
@@ -7,19 +13,25 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Now import the rest
-import os
+# Now import the rest; page modules and heavy dependencies load on first use
 import pathlib
+import importlib
+import threading
 from streamlit_option_menu import option_menu
-from pages import home, detection, patient_info, history, about, chatbot
-from utils.db_manager import create_tables
-import speech_recognition as sr
-import base64
+from utils.db_manager import create_tables, prune_chat_messages
 
-# Hide default Streamlit menu and footer using a more reliable method
-def hide_streamlit_elements():
-    # CSS to hide the default menu, footer, and header
-    hide_streamlit_style = """
+# Page name -> module under pages/
+PAGE_MODULES = {
+    "Home": "home",
+    "Skin Cancer Detection": "detection",
+    "Patient Information": "patient_info",
+    "History": "history",
+    "Chatbot": "chatbot",
+    "About": "about"
+}
+
+# CSS to hide the default menu, footer, and header
+HIDE_STREAMLIT_STYLE = """
         <style>
         #MainMenu {visibility: hidden !important;}
         footer {visibility: hidden !important;}
@@ -30,11 +42,9 @@ def hide_streamlit_elements():
         #root > div:nth-child(1) > div > div > div > div > section > div {padding-top: 0rem;}
         </style>
         """
-    # Inject the CSS with markdown
-    st.markdown(hide_streamlit_style, unsafe_allow_html=True)
-    
-    # Alternative method to hide elements
-    hide_menu_hack_js = """
+
+# Alternative method to hide elements
+HIDE_MENU_HACK_JS = """
     <script>
     // Wait for the DOM to load
     document.addEventListener('DOMContentLoaded', function() {
@@ -59,31 +69,79 @@ def hide_streamlit_elements():
     });
     </script>
     """
-    
-    # Inject JavaScript to hide menu
-    st.markdown(hide_menu_hack_js, unsafe_allow_html=True)
 
-# Custom CSS loader
-def load_css():
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent
+
+# One-time process bootstrap: schema setup, model warm-up and asset loading.
+# Streamlit reruns this script on every interaction, so the result is cached
+# for the life of the server and reruns only replay the prepared snippets.
+def _warm_up_in_background():
+    # Importing model_handler pulls in TensorFlow, so keep it off the first paint
+    def run():
+        from utils.model_handler import warm_up_models
+        warm_up_models()
+
+        # Pre-render the spoken summary of each diagnosis class
+        from pages.detection import prerender_diagnosis_audio
+        prerender_diagnosis_audio()
+
+        # Thumbnails and previews for uploads stored before derivatives existed
+        from utils.derivatives import backfill_derivatives
+        backfill_derivatives()
+
+        # Similar-lesion index entries for detections saved before the store existed
+        from utils.embedding_store import backfill_embeddings
+        try:
+            backfill_embeddings()
+        except Exception as e:
+            print(f"Error backfilling embeddings: {e}")
+    threading.Thread(target=run, name="skinscan-warmup", daemon=True).start()
+
+@st.cache_resource(show_spinner=False)
+def bootstrap():
+    create_tables()
+    # Drop spilled chat turns past their retention period
+    prune_chat_messages()
+    # Load the shared model, pre-render diagnosis audio and backfill derivatives and embeddings once per process
+    _warm_up_in_background()
+
+    assets = {'css_html': None, 'css_warning': None, 'logo_bytes': None, 'logo_warning': None}
+
+    css_path = PROJECT_ROOT / "assets" / "css" / "style.css"
     try:
-        # Get current file's directory
-        current_file = pathlib.Path(__file__).resolve()
-        # This is our project root
-        project_root = current_file.parent
-        # CSS path
-        css_path = project_root / "assets" / "css" / "style.css"
-        
-        if css_path.exists():
-            with open(css_path, "r") as f:
-                st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-        else:
-            st.warning(f"CSS file not found at: {css_path}")
+        assets['css_html'] = f"<style>{css_path.read_text()}</style>"
+    except FileNotFoundError:
+        assets['css_warning'] = f"CSS file not found at: {css_path}"
+    except Exception as e:
+        assets['css_warning'] = f"Error loading CSS: {str(e)}"
+
+    logo_path = PROJECT_ROOT / "assets" / "images" / "logo.png"
+    try:
+        assets['logo_bytes'] = logo_path.read_bytes()
+    except FileNotFoundError:
+        assets['logo_warning'] = f"Logo not found at: {logo_path}"
     except Exception as e:
-        st.warning(f"Error loading CSS: {str(e)}")
+        assets['logo_warning'] = f"Error loading logo: {str(e)}"
+
+    return assets
+
+# Hide default Streamlit menu and footer using a more reliable method
+def hide_streamlit_elements():
+    # Inject the CSS with markdown
+    st.markdown(HIDE_STREAMLIT_STYLE, unsafe_allow_html=True)
+    
+    # Inject JavaScript to hide menu
+    st.markdown(HIDE_MENU_HACK_JS, unsafe_allow_html=True)
+
+# Custom CSS loader (served from the bootstrap cache)
+def load_css(assets):
+    if assets['css_html']:
+        st.markdown(assets['css_html'], unsafe_allow_html=True)
+    elif assets['css_warning']:
+        st.warning(assets['css_warning'])
 
-# Initialize database
+# Initialize per-session state
 def initialize_db():
-    create_tables()
     if 'patient_id' not in st.session_state:
         st.session_state.patient_id = None
     
@@ -94,6 +152,7 @@ def initialize_db():
 # Speech recognition function
 def recognize_speech():
     """Recognize speech using the microphone"""
+    import speech_recognition as sr
     try:
         recognizer = sr.Recognizer()
         with sr.Microphone() as source:
@@ -134,20 +193,13 @@ def navigate_with_voice(command):
     return True
 
 # Application navigation sidebar
-def navigation():
+def navigation(assets):
     with st.sidebar:
-        try:
-            # Get the logo path using pathlib for better path handling
-            current_file = pathlib.Path(__file__).resolve()
-            project_root = current_file.parent
-            logo_path = project_root / "assets" / "images" / "logo.png"
-            
-            if logo_path.exists():
-                st.image(str(logo_path), width=200)
-            else:
-                st.warning(f"Logo not found at: {logo_path}")
-        except Exception as e:
-            st.warning(f"Error loading logo: {str(e)}")
+        # Logo bytes are read once at bootstrap
+        if assets['logo_bytes']:
+            st.image(assets['logo_bytes'], width=200)
+        elif assets['logo_warning']:
+            st.warning(assets['logo_warning'])
         
         # Get the current page from session state if set by voice or button
         default_idx = 0
@@ -217,24 +269,23 @@ def navigation():
 # Main application function
 def main():
     # Call this before any other Streamlit elements
+    assets = bootstrap()
     hide_streamlit_elements()
-    load_css()
+    load_css(assets)
     initialize_db()
-    selected = navigation()
+    selected = navigation(assets)
     
-    # Render the selected page
-    if selected == "Home":
-        home.show()
-    elif selected == "Skin Cancer Detection":
-        detection.show()
-    elif selected == "Patient Information":
-        patient_info.show()
-    elif selected == "History":
-        history.show()
-    elif selected == "Chatbot":
-        chatbot.show()
-    elif selected == "About":
-        about.show()
+    if startup_profiler.is_installed():
+        startup_profiler.mark("navigation rendered")
+
+    # Render the selected page (imported on first visit)
+    page = importlib.import_module(f"pages.{PAGE_MODULES.get(selected, 'home')}")
+    page.show()
+
+    if startup_profiler.is_installed():
+        startup_profiler.mark(f"{selected} page rendered")
+        with st.sidebar.expander("Startup profile"):
+            st.code(startup_profiler.format_report())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
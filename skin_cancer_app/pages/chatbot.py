@@ -1,133 +1,45 @@
+import uuid
 import streamlit as st
-import re
-import random
-import json
-import os
-from google.cloud import translate_v2 as translate
-
-# Load FAQ data
-def load_faq_data():
-    """Load FAQ data from JSON file, or return default data if file not found"""
-    try:
-        with open(os.path.join('assets', 'metadata', 'faq_data.json'), 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Return default FAQ data if file not found or invalid
-        return {
-            "faqs": [
-                {
-                    "question": "What are the warning signs of melanoma?",
-                    "answer": "Look for the ABCDE warning signs: Asymmetry, Border irregularity, Color variation, Diameter larger than 6mm, and Evolving size, shape, or color. If you notice any of these signs, consult a dermatologist promptly."
-                },
-                {
-                    "question": "How often should I check my skin?",
-                    "answer": "It's recommended to perform a self-examination once a month. Additionally, people with higher risk factors should have a professional skin examination by a dermatologist at least once a year."
-                },
-                {
-                    "question": "What SPF sunscreen should I use?",
-                    "answer": "Dermatologists recommend using a broad-spectrum sunscreen with an SPF of at least 30, which blocks 97% of UVB rays. Apply it generously and reapply every two hours, or more frequently if swimming or sweating."
-                },
-                {
-                    "question": "How does the SkinScan app work?",
-                    "answer": "SkinScan uses deep learning algorithms to analyze images of skin lesions. After you upload a photo, our AI model processes it and provides a prediction about the potential diagnosis, along with a confidence score and recommendations."
-                },
-                {
-                    "question": "Can SkinScan diagnose my condition?",
-                    "answer": "No, SkinScan cannot provide a medical diagnosis. It's designed as a supportive tool for healthcare professionals. All results should be reviewed by a qualified medical professional, and the app should not replace a consultation with a doctor."
-                }
-            ],
-            "general_responses": [
-                "I'm here to provide information about skin cancer and help you navigate the SkinScan app. For medical concerns, please consult a healthcare professional.",
-                "That's an interesting question. While I can provide general information about skin health, I recommend discussing specific concerns with a dermatologist.",
-                "I can help answer general questions about skin cancer and skin health, but remember that I'm not a replacement for professional medical advice."
-            ],
-            "navigation_help": {
-                "detection": "To use the detection feature, go to the 'Skin Cancer Detection' page from the main menu. There you can upload an image of a skin lesion for analysis.",
-                "patient_info": "You can manage patient information on the 'Patient Information' page. This allows you to add new patients or select existing ones before performing a detection.",
-                "history": "The 'Detection History' page shows all previous analyses for the current patient or all patients. You can filter and sort the history as needed."
-            }
-        }
-
-# FAQ data cache
-_faq_data = None
-
-def get_faq_data():
-    """Get FAQ data with caching"""
-    global _faq_data
-    if _faq_data is None:
-        _faq_data = load_faq_data()
-    return _faq_data
-
-def preprocess_query(query):
-    """Preprocess user query for better matching"""
-    query = query.lower()
-    query = re.sub(r'[^\w\s]', '', query)  # Remove punctuation
-    query = ' '.join(query.split())  # Remove extra whitespace
-    return query
-
-def get_best_match_faq(query):
-    """Find the best matching FAQ for a query"""
-    preprocessed_query = preprocess_query(query)
-    faq_data = get_faq_data()
-
-    best_match = None
-    best_score = 0
-
-    for faq in faq_data["faqs"]:
-        faq_question = preprocess_query(faq["question"])
-        words_in_query = set(preprocessed_query.split())
-        words_in_faq = set(faq_question.split())
-        common_words = words_in_query.intersection(words_in_faq)
-
-        score = len(common_words) / len(words_in_query) if words_in_query else 0
-
-        skin_cancer_terms = ["melanoma", "basal", "carcinoma", "squamous", "skin", "cancer",
-                             "mole", "lesion", "sunscreen", "spf", "uv", "abcde"]
-        for term in skin_cancer_terms:
-            if term in preprocessed_query and term in faq_question:
-                score += 0.2
-
-        if score > best_score:
-            best_score = score
-            best_match = faq
-
-    return best_match["answer"] if best_score > 0.4 else None
-
-def get_navigation_help(query):
-    """Provide navigation help based on user query"""
-    preprocessed_query = preprocess_query(query)
-    faq_data = get_faq_data()
-
-    navigation_terms = {
-        "detection": ["detection", "analyze", "scan", "upload", "image", "photo"],
-        "patient_info": ["patient", "information", "profile", "register"],
-        "history": ["history", "previous", "past", "record"]
-    }
-
-    for nav_type, terms in navigation_terms.items():
-        if any(term in preprocessed_query for term in terms):
-            return faq_data["navigation_help"].get(nav_type, "Use the navigation menu to explore the app.")
-
-    return None
-
-def get_faq_response(query):
-    """Get response from FAQ database"""
-    response = get_best_match_faq(query)
-    return response if response else get_navigation_help(query) or random.choice(get_faq_data()["general_responses"])
-
-def get_chatbot_response(query):
-    """Generate a response for the user query"""
-    greetings = ["hello", "hi", "hey", "greetings"]
-    if preprocess_query(query) in greetings:
-        return "Hello! How can I help you with skin cancer information or using the SkinScan app today?"
-
-    if any(term in preprocess_query(query) for term in ["skinscan", "app", "application"]):
-        if "how" in query.lower() and any(word in query.lower() for word in ["use", "work"]):
-            return "SkinScan works by analyzing images of skin lesions using AI. Upload an image in the Detection page to get a result."
-        if "accurate" in query.lower():
-            return "SkinScan achieves around 85-90% accuracy on validation datasets, but should be used as a supportive tool for doctors."
-
-    return get_faq_response(query)
+from collections import deque
+from utils.chatbot_utils import get_chatbot_response
+from utils.db_manager import add_chat_messages, get_chat_messages, CHAT_MAX_MESSAGES_PER_SESSION
+
+# Messages kept in session memory; older ones are spilled to SQLite
+CHAT_BUFFER_SIZE = 50
+# Messages rendered initially, and how many more each "load earlier" adds
+CHAT_WINDOW = 20
+CHAT_WINDOW_STEP = 20
+
+def init_chat_state():
+    """Set up the bounded chat buffer and its spill-over bookkeeping"""
+    if "chat_session_id" not in st.session_state:
+        st.session_state.chat_session_id = uuid.uuid4().hex
+    if not isinstance(st.session_state.get("chat_history"), deque):
+        st.session_state.chat_history = deque(st.session_state.get("chat_history", []), maxlen=CHAT_BUFFER_SIZE)
+    if "chat_spilled" not in st.session_state:
+        st.session_state.chat_spilled = 0
+    if "chat_window" not in st.session_state:
+        st.session_state.chat_window = CHAT_WINDOW
+
+def append_message(role, content):
+    """Add a message to the ring buffer, spilling the oldest one to the database when full"""
+    history = st.session_state.chat_history
+    if len(history) == history.maxlen:
+        add_chat_messages(st.session_state.chat_session_id, [history[0]])
+        # The database keeps at most CHAT_MAX_MESSAGES_PER_SESSION spilled messages
+        st.session_state.chat_spilled = min(st.session_state.chat_spilled + 1, CHAT_MAX_MESSAGES_PER_SESSION)
+    history.append({"role": role, "content": content})
+
+def visible_messages():
+    """Messages inside the current render window, loading spilled ones only when needed"""
+    history = st.session_state.chat_history
+    window = st.session_state.chat_window
+    buffered = list(history)[-window:]
+    missing = window - len(buffered)
+    if missing > 0 and st.session_state.chat_spilled:
+        older = get_chat_messages(st.session_state.chat_session_id, min(missing, st.session_state.chat_spilled))
+        return older + buffered
+    return buffered
 
 # Add the show() function that app.py is trying to call
 def show():
@@ -144,11 +56,17 @@ def show():
     """)
     
     # Initialize chat history
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+    init_chat_state()
+    
+    # Offer older turns only when there are more than the window shows
+    total_messages = st.session_state.chat_spilled + len(st.session_state.chat_history)
+    if total_messages > st.session_state.chat_window:
+        if st.button("Load earlier messages"):
+            st.session_state.chat_window += CHAT_WINDOW_STEP
+            st.rerun()
     
-    # Display chat history
-    for message in st.session_state.chat_history:
+    # Display the visible window of chat history
+    for message in visible_messages():
         with st.chat_message(message["role"]):
             st.write(message["content"])
     
@@ -157,19 +75,18 @@ def show():
     
     if user_query:
         # Add user message to chat history
-        st.session_state.chat_history.append({"role": "user", "content": user_query})
+        append_message("user", user_query)
         # Display user message
         with st.chat_message("user"):
             st.write(user_query)
         
-        # Generate response
+        # Responses are looked up, not generated, so they are shown in one piece
         response = get_chatbot_response(user_query)
-        
-        # Add assistant response to chat history
-        st.session_state.chat_history.append({"role": "assistant", "content": response})
-        # Display assistant response
         with st.chat_message("assistant"):
             st.write(response)
+        
+        # Add assistant response to chat history
+        append_message("assistant", response)
             
     # Add a disclaimer at the bottom
     st.markdown("---")
@@ -1,66 +1,26 @@
 import streamlit as st
 import os
 import time
+import queue
+import threading
+import cv2
 import numpy as np
-from PIL import Image
 from datetime import datetime
-import matplotlib.pyplot as plt
-import io
-import base64
 import random
-import gtts
 from pathlib import Path
-from fpdf import FPDF
-import tempfile
-
-# Define skin cancer classes and information
-SKIN_CLASSES = {
-    "melanoma": "Melanoma",
-    "basal_cell_carcinoma": "Basal Cell Carcinoma",
-    "squamous_cell_carcinoma": "Squamous Cell Carcinoma",
-    "actinic_keratosis": "Actinic Keratosis",
-    "nevus": "Benign Nevus (Mole)",
-    "seborrheic_keratosis": "Seborrheic Keratosis",
-    "dermatofibroma": "Dermatofibroma"
-}
-
-CLASS_INFO = {
-    "melanoma": {
-        "risk_level": "High",
-        "description": "Melanoma is the most dangerous form of skin cancer. It develops in melanocytes, the cells that produce melanin. Melanomas often resemble moles and some develop from moles.",
-        "recommendation": "Immediate referral to a dermatologist for biopsy and treatment planning. Melanoma can be life-threatening if not treated early."
-    },
-    "basal_cell_carcinoma": {
-        "risk_level": "Medium",
-        "description": "Basal cell carcinoma is the most common form of skin cancer. It rarely spreads to other parts of the body but can be locally destructive if not treated.",
-        "recommendation": "Referral to a dermatologist for removal. Various treatment options include surgical excision, Mohs surgery, or topical medications."
-    },
-    "squamous_cell_carcinoma": {
-        "risk_level": "Medium-High",
-        "description": "Squamous cell carcinoma is the second most common form of skin cancer. It's more likely to spread than basal cell carcinoma but still has a good prognosis when caught early.",
-        "recommendation": "Prompt referral to a dermatologist for biopsy and treatment. May require excision, radiation therapy, or topical treatments."
-    },
-    "actinic_keratosis": {
-        "risk_level": "Medium-Low",
-        "description": "Actinic keratosis is a precancerous lesion that may develop into squamous cell carcinoma if left untreated. It appears as a rough, scaly patch on skin frequently exposed to the sun.",
-        "recommendation": "Dermatologist evaluation within 1-2 months. Treatment options include cryotherapy, topical medications, or photodynamic therapy."
-    },
-    "nevus": {
-        "risk_level": "Low",
-        "description": "A benign nevus (mole) is a common growth on the skin that develops when pigment cells grow in clusters. Most are harmless, but some may develop into melanoma.",
-        "recommendation": "Regular self-monitoring for changes in size, shape, color, or symptoms. Follow up with dermatologist during regular skin checks."
-    },
-    "seborrheic_keratosis": {
-        "risk_level": "Low",
-        "description": "Seborrheic keratosis is a benign skin growth that appears as a waxy, scaly, slightly raised growth. They are very common and not cancerous.",
-        "recommendation": "No treatment necessary unless for cosmetic reasons or if the lesion becomes irritated. Can be removed by freezing, curettage, or laser therapy if desired."
-    },
-    "dermatofibroma": {
-        "risk_level": "Low",
-        "description": "Dermatofibroma is a common benign skin growth that often appears as a small, firm bump. They are usually asymptomatic and harmless.",
-        "recommendation": "No treatment necessary. Can be monitored for changes. Removal is an option if the lesion is bothersome or for cosmetic reasons."
-    }
-}
+from concurrent.futures import ThreadPoolExecutor
+from utils.image_processor import ImageContext, as_image_context, embed_images, lesion_features
+from utils.embedding_store import get_embedding_store
+from utils import db_manager
+from utils.result_cache import get_result_cache, hash_bytes, hash_image_file
+from utils.blob_store import get_blob_store
+from utils.derivatives import generate_derivatives, get_derivative
+from utils.tts_cache import get_tts_cache
+from utils.classes import SKIN_CLASSES, CLASS_INFO
+from utils.report_generator import build_report_data, render_reports_pdf
+from utils.figure_renderer import (
+    PANEL_SIZE, compose_grid, histogram_panel, hot_colormap, bar_chart, hex_to_rgb, to_png_bytes
+)
 
 class RandomSkinCancerModel:
     """A mock model that randomly predicts skin cancer types"""
@@ -78,9 +38,6 @@ class RandomSkinCancerModel:
         # Generate a confidence score between 0.7 and 0.98
         confidence = random.uniform(0.7, 0.98)
 
-        # Simulate processing time to make it feel realistic
-        time.sleep(2)
-
         return predicted_class, confidence
 
     def get_class_info(self, class_name):
@@ -90,78 +47,199 @@ class RandomSkinCancerModel:
             "info": CLASS_INFO[class_name]
         }
 
-def get_image_features(image_path):
-    """Generate random image features for display"""
-    # Random feature values that seem plausible
-    return {
-        "area": random.randint(10000, 50000),
-        "perimeter": random.uniform(300, 1200),
-        "circularity": random.uniform(0.5, 0.95),
-        "asymmetry": random.uniform(0.1, 0.5)
-    }
-
-def create_analysis_plots(image_path):
-    """Create a visualization of the image analysis"""
-    # Create a figure with 2x2 subplots
-    fig, axes = plt.subplots(2, 2, figsize=(8, 8))
-
-    # Load the original image
-    img = Image.open(image_path)
-    img_array = np.array(img)
-
-    # Plot original image
-    axes[0, 0].imshow(img_array)
-    axes[0, 0].set_title("Original Image")
-    axes[0, 0].axis("off")
+# Bump when the model or any analysis stage changes so cached results are invalidated
+PIPELINE_VERSION = "random-mock-v3"
+
+def get_image_hash(image_path):
+    """Content hash of an uploaded image, memoized per session"""
+    if 'image_hashes' not in st.session_state:
+        st.session_state.image_hashes = {}
+    if image_path not in st.session_state.image_hashes:
+        st.session_state.image_hashes[image_path] = hash_image_file(image_path)
+    return st.session_state.image_hashes[image_path]
+
+def ingest_upload(uploaded_file):
+    """Persist an upload and load its preview once per session; later reruns reuse the session copy"""
+    upload_id = getattr(uploaded_file, 'file_id', None) or (uploaded_file.name, uploaded_file.size)
+    ingested = st.session_state.get('ingested_upload')
+    if ingested and ingested['upload_id'] == upload_id:
+        return ingested
+
+    data = uploaded_file.getvalue()
+    image_hash = hash_bytes(data)
+    file_path = get_blob_store().put(data, uploaded_file.name, digest=image_hash)
+    preview_path = generate_derivatives(file_path)['preview']
+    with open(preview_path, 'rb') as f:
+        preview = f.read()
+
+    # Seed the hash memo so the analysis cache never re-reads the file
+    if 'image_hashes' not in st.session_state:
+        st.session_state.image_hashes = {}
+    st.session_state.image_hashes[file_path] = image_hash
+
+    ingested = {'upload_id': upload_id, 'path': file_path, 'preview': preview}
+    st.session_state.ingested_upload = ingested
+    return ingested
+
+def get_image_context(image_path):
+    """The session's shared ImageContext for an upload, keyed by its content hash.
+
+    Only the current upload's context is kept, so at most one decoded image
+    lives in session state.
+    """
+    image_hash = get_image_hash(image_path)
+    current = st.session_state.get('image_context')
+    if current is None or current['hash'] != image_hash:
+        current = {'hash': image_hash, 'ctx': ImageContext(image_path)}
+        st.session_state.image_context = current
+    return current['ctx']
+
+def cached_result(image_path, name, compute_fn, *params):
+    """Return a result for this image from the content-addressed cache, computing it on a miss"""
+    cache = get_result_cache()
+    key = cache.make_key(get_image_hash(image_path), PIPELINE_VERSION, name, *params)
+    return cache.get_or_compute(key, compute_fn)
+
+# Inference runs on a shared worker pool; the script thread only renders progress
+INFERENCE_STAGES = {
+    "decode": (0.25, "Decoding image..."),
+    "preprocess": (0.5, "Preprocessing image..."),
+    "forward": (0.75, "Running model..."),
+    "postprocess": (1.0, "Preparing results...")
+}
+
+_inference_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="skinscan-inference")
+
+def run_inference(ctx, progress_queue):
+    """Run the full analysis for one ImageContext, reporting each stage on progress_queue"""
+    model = RandomSkinCancerModel()
+
+    progress_queue.put("decode")
+    ctx.rgb  # Force the decode so it is reported as its own stage
+
+    progress_queue.put("preprocess")
+    img_array = ctx.resized.astype(np.float32) / 255.0
+
+    progress_queue.put("forward")
+    predicted_class, confidence = model.predict(img_array)
+
+    progress_queue.put("postprocess")
+    return predicted_class, float(confidence)
+
+def analyze_with_progress(image_path, progress_bar):
+    """Submit inference to the worker pool and drive progress_bar from its stage events"""
+    progress_queue = queue.Queue()
+    future = _inference_pool.submit(run_inference, get_image_context(image_path), progress_queue)
+
+    while True:
+        try:
+            stage = progress_queue.get(timeout=0.05)
+        except queue.Empty:
+            if future.done() and progress_queue.empty():
+                break
+            continue
+        fraction, label = INFERENCE_STAGES[stage]
+        progress_bar.progress(fraction, text=label)
+
+    return future.result()
+
+def get_image_features(image):
+    """ABCD lesion features measured from the segmentation mask (path or ImageContext)"""
+    return lesion_features(image)
+
+def create_analysis_plots(image):
+    """Create a 2x2 visualization of the image analysis and return it as PNG bytes"""
+    # Panels are drawn from a display-sized pyramid level of the shared decode
+    ctx = as_image_context(image)
+    img_array = ctx.level(max(PANEL_SIZE))
 
     # Create a simulated segmented image (grayscale version with threshold)
-    try:
-        gray_img = np.mean(img_array, axis=2).astype(np.uint8)
-    except:
-        # Handle grayscale images
-        gray_img = img_array.astype(np.uint8)
+    gray_img = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
 
     # Apply random threshold
     threshold = random.randint(100, 150)
     binary_img = (gray_img > threshold).astype(np.uint8) * 255
 
-    # Plot segmented image
-    axes[0, 1].imshow(binary_img, cmap='gray')
-    axes[0, 1].set_title("Lesion Segmentation")
-    axes[0, 1].axis("off")
+    # Heatmap (random data) generated directly at display resolution
+    heatmap_data = np.random.rand(PANEL_SIZE[1], PANEL_SIZE[0])
 
-    # Plot a heatmap (random data)
-    heatmap_data = np.random.rand(img_array.shape[0], img_array.shape[1])
-    axes[1, 0].imshow(heatmap_data, cmap='hot')
-    axes[1, 0].set_title("Feature Heatmap")
-    axes[1, 0].axis("off")
-
-    # Plot a feature histogram
+    # Feature histogram
     feature_values = np.random.normal(0.5, 0.15, 1000)
-    axes[1, 1].hist(feature_values, bins=20, color='skyblue', edgecolor='black')
-    axes[1, 1].set_title("Feature Distribution")
-    axes[1, 1].set_xlabel("Feature Value")
-    axes[1, 1].set_ylabel("Frequency")
-
-    plt.tight_layout()
 
-    # Convert plot to image
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
+    figure = compose_grid([
+        ("Original Image", img_array),
+        ("Lesion Segmentation", binary_img),
+        ("Feature Heatmap", hot_colormap(heatmap_data)),
+        ("Feature Distribution", histogram_panel(feature_values, bins=20))
+    ])
+    return to_png_bytes(figure)
+
+# Embeddings are computed on the inference pool, never on the script thread:
+# the first one builds VGG16 (TensorFlow import plus the ImageNet weights).
+# One job per image hash; a failed job is kept as a negative entry and only
+# retried after EMBEDDING_RETRY_SECONDS.
+EMBEDDING_RETRY_SECONDS = 10 * 60
+_embedding_jobs = {}
+_embedding_jobs_lock = threading.Lock()
+
+def compute_lesion_embedding(image_hash, ctx):
+    """VGG16 embedding of ctx through the result cache, or None if it could not be computed"""
+    cache = get_result_cache()
+    key = cache.make_key(image_hash, PIPELINE_VERSION, "embedding")
+    try:
+        return cache.get_or_compute(key, lambda: embed_images([ctx])[0])
+    except Exception as e:
+        print(f"Error computing embedding: {e}")
+        return None
 
-    # Encode to base64 for Streamlit
-    data = base64.b64encode(buf.read()).decode('utf-8')
-    return f"data:image/png;base64,{data}"
+def request_lesion_embedding(image_path):
+    """Future for the image's embedding, submitting the job on first request"""
+    image_hash = get_image_hash(image_path)
+    with _embedding_jobs_lock:
+        job = _embedding_jobs.get(image_hash)
+        if job is not None:
+            future, submitted_at = job
+            failed = future.done() and future.result() is None
+            if not failed or time.time() - submitted_at < EMBEDDING_RETRY_SECONDS:
+                return future
+        future = _inference_pool.submit(compute_lesion_embedding, image_hash, get_image_context(image_path))
+        _embedding_jobs[image_hash] = (future, time.time())
+        return future
+
+def get_lesion_embedding(image_path):
+    """The image's embedding if its job has finished, None while pending or after a failure"""
+    future = request_lesion_embedding(image_path)
+    return future.result() if future.done() else None
+
+def find_similar_lesions(image_path, k=5, exclude_ids=()):
+    """Return the k most similar saved detections as (record, similarity) pairs, or None while the embedding is pending.
+
+    Detections of this same image (e.g. the record just saved from it) are left out.
+    """
+    future = request_lesion_embedding(image_path)
+    if not future.done():
+        return None
+    embedding = future.result()
+    if embedding is None:
+        return []
+    exclude_ids = set(exclude_ids) | set(db_manager.get_detection_ids_for_image(image_path))
+    matches = get_embedding_store().query(embedding, k=k, exclude_ids=exclude_ids)
+    similarity = dict(matches)
+    records = db_manager.get_detection_results_by_ids([result_id for result_id, _ in matches])
+    return [(record, similarity[record['id']]) for record in records]
 
 def save_detection_result(patient_id, image_path, prediction, confidence, location, notes):
-    """Mock function to save detection results"""
-    # Generate a random ID for the record
-    result_id = f"RES{random.randint(10000, 99999)}"
-
-    # In a real implementation, this would save to a database
-    # For now, just return the ID to simulate saving
+    """Save detection results to the database; the embedding is indexed once its job finishes"""
+    result_id = db_manager.save_detection_result(patient_id, image_path, prediction, confidence, location, notes)
+
+    def index_embedding(future):
+        embedding = future.result()
+        if embedding is not None:
+            try:
+                get_embedding_store().add(result_id, embedding)
+            except Exception as e:
+                print(f"Error indexing embedding: {e}")
+    request_lesion_embedding(image_path).add_done_callback(index_embedding)
     return result_id
 
 def create_confidence_chart(predicted_class, confidence):
@@ -186,35 +264,14 @@ def create_confidence_chart(predicted_class, confidence):
                 # Last class gets what's left
                 confidence_values.append(remaining)
 
-    # Create the chart
-    fig, ax = plt.subplots(figsize=(10, 6))
-    bars = ax.barh(
+    # Draw the chart
+    figure = bar_chart(
         [SKIN_CLASSES[c] for c in classes],
         confidence_values,
-        color=['#3498DB' if c == predicted_class else '#AED6F1' for c in classes]
+        [hex_to_rgb('#3498DB') if c == predicted_class else hex_to_rgb('#AED6F1') for c in classes],
+        'Diagnosis Confidence Levels'
     )
-
-    # Add data labels
-    for i, bar in enumerate(bars):
-        width = bar.get_width()
-        label_x_pos = width + 0.01
-        ax.text(label_x_pos, bar.get_y() + bar.get_height()/2, f'{width:.1%}',
-                va='center')
-
-    ax.set_xlim(0, 1.0)
-    ax.set_xlabel('Confidence')
-    ax.set_title('Diagnosis Confidence Levels')
-    plt.tight_layout()
-
-    # Convert plot to image
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
-
-    # Encode to base64 for Streamlit
-    data = base64.b64encode(buf.read()).decode('utf-8')
-    return f"data:image/png;base64,{data}"
+    return to_png_bytes(figure)
 
 def get_result_class(risk_level):
     """Return the appropriate CSS class based on risk level"""
@@ -225,115 +282,34 @@ def get_result_class(risk_level):
     else:
         return "result-negative"
 
+def diagnosis_tts_text(class_info):
+    """Spoken summary for a diagnosis (one fixed text per class)"""
+    return f"""
+    Diagnosis: {class_info['name']}. 
+    Risk Level: {class_info['info']['risk_level']}. 
+    {class_info['info']['description']} 
+    Recommendation: {class_info['info']['recommendation']}
+    """
+
+def prerender_diagnosis_audio():
+    """Synthesize the spoken summary of every class so later requests are served from cache"""
+    model = RandomSkinCancerModel()
+    texts = [diagnosis_tts_text(model.get_class_info(class_name)) for class_name in SKIN_CLASSES]
+    return get_tts_cache().prerender(texts)
+
 def text_to_speech(text):
-    """Convert text to speech and return audio player HTML"""
+    """Convert text to speech and return (audio bytes, mime type), using the TTS cache"""
     try:
-        # Create gtts object
-        tts = gtts.gTTS(text, lang="en")
-        
-        # Create audio directory if it doesn't exist
-        os.makedirs("data/audio", exist_ok=True)
-        
-        # Generate a unique filename
-        filename = f"data/audio/speech_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-        
-        # Save audio file
-        tts.save(filename)
-        
-        # Get the file as bytes for audio player
-        audio_file = open(filename, 'rb')
-        audio_bytes = audio_file.read()
-        audio_file.close()
-        
-        return audio_bytes
+        return get_tts_cache().synthesize(text, lang="en")
     except Exception as e:
         st.error(f"Error generating audio: {e}")
-        return None
+        return None, None
 
 def create_pdf_report(patient_id, predicted_class, confidence, class_info, features, lesion_location, notes, image_path):
-    """Create a PDF report with detection results"""
+    """Create a PDF report with detection results and return it as bytes"""
     try:
-        # Create a PDF object
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Set font
-        pdf.set_font("Arial", "B", 16)
-        
-        # Title
-        pdf.cell(0, 10, "Skin Cancer Detection Report", ln=True, align="C")
-        pdf.ln(5)
-        
-        # Add date and patient ID
-        pdf.set_font("Arial", "", 12)
-        pdf.cell(0, 10, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}", ln=True)
-        pdf.cell(0, 10, f"Patient ID: {patient_id}", ln=True)
-        pdf.ln(5)
-        
-        # Add diagnosis information
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, "Diagnosis Results", ln=True)
-        
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, f"Diagnosis: {class_info['name']}", ln=True)
-        
-        pdf.set_font("Arial", "", 12)
-        pdf.cell(0, 10, f"Confidence: {confidence * 100:.1f}%", ln=True)
-        pdf.cell(0, 10, f"Risk Level: {class_info['info']['risk_level']}", ln=True)
-        pdf.cell(0, 10, f"Lesion Location: {lesion_location}", ln=True)
-        pdf.ln(5)
-        
-        # Add description and recommendation
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, "Description:", ln=True)
-        
-        pdf.set_font("Arial", "", 12)
-        # Multi-line text
-        pdf.multi_cell(0, 10, class_info['info']['description'])
-        pdf.ln(5)
-        
-        pdf.set_font("Arial", "B", 12)
-        pdf.cell(0, 10, "Recommendation:", ln=True)
-        
-        pdf.set_font("Arial", "", 12)
-        pdf.multi_cell(0, 10, class_info['info']['recommendation'])
-        pdf.ln(5)
-        
-        # Add lesion features
-        pdf.set_font("Arial", "B", 14)
-        pdf.cell(0, 10, "Lesion Features", ln=True)
-        
-        pdf.set_font("Arial", "", 12)
-        pdf.cell(0, 10, f"Area: {features['area']} pixels", ln=True)
-        pdf.cell(0, 10, f"Perimeter: {features['perimeter']:.1f} pixels", ln=True)
-        pdf.cell(0, 10, f"Circularity: {features['circularity']:.3f}", ln=True)
-        pdf.cell(0, 10, f"Asymmetry Factor: {features['asymmetry']:.3f}", ln=True)
-        pdf.ln(5)
-        
-        # Add notes
-        if notes:
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(0, 10, "Notes", ln=True)
-            
-            pdf.set_font("Arial", "", 12)
-            pdf.multi_cell(0, 10, notes)
-            pdf.ln(5)
-        
-        # Add image if possible
-        try:
-            if image_path and os.path.exists(image_path):
-                pdf.set_font("Arial", "B", 14)
-                pdf.cell(0, 10, "Lesion Image", ln=True)
-                pdf.image(image_path, x=None, y=None, w=80)
-        except Exception as img_error:
-            pass  # Skip image if there's any error
-        
-        # Save PDF to a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        pdf_path = temp_file.name
-        pdf.output(pdf_path)
-        
-        return pdf_path
+        report = build_report_data(patient_id, class_info, confidence, lesion_location, notes, image_path, features=features)
+        return render_reports_pdf([report])
     except Exception as e:
         st.error(f"Error creating PDF: {e}")
         return None
@@ -393,32 +369,15 @@ def show():
         with col1:
             if uploaded_file is not None:
                 try:
-                    # Create directory if it doesn't exist
-                    os.makedirs("data/uploaded_images", exist_ok=True)
-
-                    # Save the uploaded file
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    file_path = f"data/uploaded_images/{timestamp}_{uploaded_file.name}"
-                    with open(file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-                    
+                    # Hash, store and decode the upload only the first time this session sees it
+                    upload = ingest_upload(uploaded_file)
+
                     # Save to session state
-                    st.session_state.uploaded_image = file_path   
+                    st.session_state.uploaded_image = upload['path']
 
-                    # Display the uploaded image - adding error handling
+                    # Display the cached preview - adding error handling
                     try:
-                        # Reset the file pointer to the beginning
-                        uploaded_file.seek(0)
-                
-                        # Read the image using PIL
-                        image = Image.open(uploaded_file)
-                
-                        # Convert to RGB if needed (handles RGBA or other formats)
-                        if image.mode != "RGB":
-                            image = image.convert("RGB")
-                
-                        # Display with error handling
-                        st.image(image, caption="Uploaded Image", width=None)
+                        st.image(upload['preview'], caption="Uploaded Image", width=None)
                     except Exception as e:
                         st.error(f"Error displaying image: {str(e)}")
                         st.warning("Try uploading a different image format (JPG or PNG recommended)")
@@ -448,17 +407,13 @@ def show():
                 with st.form(key="analyze_form"):
                     if st.form_submit_button("Analyze Image"):
                         with st.spinner("Analyzing image..."):
-                            # Simulate model loading time
+                            # Progress follows the real inference stages
                             progress_bar = st.progress(0)
-                            for i in range(100):
-                                time.sleep(0.02)
-                                progress_bar.progress(i + 1)
-
-                            # Create model instance
-                            model = RandomSkinCancerModel()
-
-                            # Predict
-                            predicted_class, confidence = model.predict(st.session_state.uploaded_image)
+                            predicted_class, confidence = analyze_with_progress(
+                                st.session_state.uploaded_image, progress_bar
+                            )
+                            # Similar-lesion search needs the embedding; start it in the background
+                            request_lesion_embedding(st.session_state.uploaded_image)
 
                             # Save results to session state
                             st.session_state.prediction_result = predicted_class
@@ -466,7 +421,6 @@ def show():
                             st.session_state.analysis_complete = True
 
                             # Switch to the Analysis Results tab
-                            time.sleep(0.5)
                             st.rerun()
 
     with tab2:
@@ -499,34 +453,37 @@ def show():
                 # Text to speech feature
                 with st.expander("Listen to Diagnosis Information"):
                     # Prepare text for text-to-speech
-                    tts_text = f"""
-                    Diagnosis: {class_info['name']}. 
-                    Risk Level: {class_info['info']['risk_level']}. 
-                    {class_info['info']['description']} 
-                    Recommendation: {class_info['info']['recommendation']}
-                    """
+                    tts_text = diagnosis_tts_text(class_info)
                     
                     # Button to generate audio
                     if st.button("Generate Audio"):
                         with st.spinner("Generating audio..."):
-                            audio_bytes = text_to_speech(tts_text)
+                            audio_bytes, audio_format = text_to_speech(tts_text)
                             if audio_bytes:
-                                st.audio(audio_bytes, format='audio/mp3')
+                                st.audio(audio_bytes, format=audio_format)
                                 st.success("Audio generated successfully!")
 
                 # Create visualization of confidence for all classes
                 st.markdown("<h3>Confidence Levels</h3>", unsafe_allow_html=True)
-                confidence_chart = create_confidence_chart(st.session_state.prediction_result, st.session_state.confidence)
-                st.markdown(f'<img src="{confidence_chart}" width="100%"/>', unsafe_allow_html=True)
+                confidence_chart = cached_result(
+                    st.session_state.uploaded_image, "confidence_chart",
+                    lambda: create_confidence_chart(st.session_state.prediction_result, st.session_state.confidence),
+                    st.session_state.prediction_result, st.session_state.confidence
+                )
+                st.image(confidence_chart, use_column_width=True)
 
             with col2:
                 if st.session_state.uploaded_image:
+                    # Shared decode of the upload (only touched on a cache miss)
+                    image_path = st.session_state.uploaded_image
+                    image_ctx = get_image_context(image_path)
+
                     # Display analysis images
-                    analysis_plots = create_analysis_plots(st.session_state.uploaded_image)
-                    st.markdown(f'<img src="{analysis_plots}" width="100%"/>', unsafe_allow_html=True)
+                    analysis_plots = cached_result(image_path, "analysis_plots", lambda: create_analysis_plots(image_ctx))
+                    st.image(analysis_plots, use_column_width=True)
 
                     # Display extracted features
-                    features = get_image_features(st.session_state.uploaded_image)
+                    features = cached_result(image_path, "features", lambda: get_image_features(image_ctx))
                     st.markdown("<h3>Image Analysis</h3>", unsafe_allow_html=True)
                     st.markdown(f"""
                     <div class="info-panel">
@@ -534,9 +491,33 @@ def show():
                         <p><strong>Perimeter:</strong> {features['perimeter']:.1f} pixels</p>
                         <p><strong>Circularity:</strong> {features['circularity']:.3f}</p>
                         <p><strong>Asymmetry Factor:</strong> {features['asymmetry']:.3f}</p>
+                        <p><strong>Border Irregularity:</strong> {features['border_irregularity']:.3f}</p>
+                        <p><strong>Colour Variegation:</strong> {features['color_variegation']:.3f}</p>
+                        <p><strong>Diameter:</strong> {features['diameter']:.1f} pixels</p>
                     </div>
                     """, unsafe_allow_html=True)
 
+                    # Most similar lesions from past detections
+                    with st.expander("Similar Past Lesions"):
+                        similar = find_similar_lesions(image_path, k=5)
+                        if similar is None:
+                            st.info("Still computing the image embedding; reopen this section in a moment.")
+                            similar = []
+                        elif not similar:
+                            st.info("No similar lesions found in saved records.")
+                        for record, score in similar:
+                            sim_col1, sim_col2 = st.columns([1, 2])
+                            with sim_col1:
+                                if record['image_path'] and os.path.exists(record['image_path']):
+                                    st.image(get_derivative(record['image_path'], 'thumb'), width=100)
+                            with sim_col2:
+                                patient_name = record['patient_name'] or f"Patient {record['patient_id']}"
+                                st.markdown(f"""
+                                <p><strong>{SKIN_CLASSES.get(record['diagnosis'], record['diagnosis'])}</strong>
+                                ({score * 100:.1f}% similar)<br>
+                                {patient_name} | {record['created_at']}</p>
+                                """, unsafe_allow_html=True)
+
             # Button to move to save tab
             with st.form(key="save_results_form"):
                 if st.form_submit_button("Save Results"):
@@ -551,13 +532,16 @@ def show():
             # Display summary
             model = RandomSkinCancerModel()
             class_info = model.get_class_info(st.session_state.prediction_result)
-            features = get_image_features(st.session_state.uploaded_image)
+            features = cached_result(
+                st.session_state.uploaded_image, "features",
+                lambda: get_image_features(get_image_context(st.session_state.uploaded_image))
+            )
 
             col1, col2 = st.columns([1, 1])
 
             with col1:
                 if st.session_state.uploaded_image:
-                    st.image(st.session_state.uploaded_image, caption="Analyzed Image", width=300)
+                    st.image(get_derivative(st.session_state.uploaded_image, 'thumb'), caption="Analyzed Image", width=300)
 
             with col2:
                 st.markdown(f"""
@@ -578,7 +562,7 @@ def show():
             
             if st.button("Generate PDF Report"):
                 with st.spinner("Generating PDF report..."):
-                    pdf_path = create_pdf_report(
+                    pdf_bytes = create_pdf_report(
                         st.session_state.patient_id,
                         st.session_state.prediction_result,
                         st.session_state.confidence,
@@ -589,11 +573,7 @@ def show():
                         st.session_state.uploaded_image
                     )
                     
-                    if pdf_path:
-                        # Read PDF file
-                        with open(pdf_path, "rb") as f:
-                            pdf_bytes = f.read()
-                        
+                    if pdf_bytes:
                         # Create download button
                         st.download_button(
                             label="Download PDF Report",
@@ -635,6 +615,7 @@ def show():
                 with st.form(key="new_analysis_form"):
                     if st.form_submit_button("New Analysis"):
                         st.session_state.uploaded_image = None
+                        st.session_state.pop('image_context', None)
                         st.session_state.analysis_complete = False
                         st.session_state.prediction_result = None
                         st.session_state.confidence = None
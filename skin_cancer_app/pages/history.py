@@ -1,7 +1,14 @@
 import streamlit as st
 import pandas as pd
-from utils.model_handler import SkinCancerModel
-from utils.db_manager import get_all_detection_history, get_patient_detection_history, get_all_patients, get_patient
+from utils.classes import RISK_LEVELS, resolve_class_info, diagnoses_for_risk
+from utils.db_manager import (
+    get_detection_history_page, get_detection_diagnoses,
+    get_patients_page, search_patients, get_patient
+)
+from utils.derivatives import get_derivative
+
+# Number of records rendered per history page
+PAGE_SIZE = 25
 
 def show():
     """Display the detection history page"""
@@ -14,28 +21,32 @@ def show():
     view_mode = st.radio("View mode:", ["All Patients", "Single Patient"])
     
     if view_mode == "All Patients":
-        # Fetch all detection history from the database
-        history = get_all_detection_history()
-        if not history:
-            st.info("No detection history available.")
-            return
-        
-        display_all_history(history)
+        display_all_history()
     else:
-        # Get list of patients for selection
-        patients = get_all_patients()
+        # Patients to choose from: search matches, or the most recent page
+        search_query = st.text_input("Search patients")
+        if search_query:
+            patients = search_patients(search_query, limit=PAGE_SIZE)
+        else:
+            patients, _ = get_patients_page(page_size=PAGE_SIZE)
+        # Keep the patient selected elsewhere in the app reachable
+        current_id = st.session_state.get('patient_id')
+        if not search_query and current_id and all(p['id'] != current_id for p in patients):
+            current = get_patient(current_id)
+            if current:
+                patients = [current] + list(patients)
         if not patients:
-            st.info("No patients available in the system.")
+            st.info("No matching patients." if search_query else "No patients available in the system.")
             return
         
         # Create a list of patient options
-        patient_options = [(p['id'], f"{p['name']} (ID: {p['id']})") for p in patients]
+        patient_options = {p['id']: f"{p['name']} (ID: {p['id']})" for p in patients}
         
         # Patient selection
         selected_patient_id = st.selectbox(
             "Select Patient:",
-            options=[p[0] for p in patient_options],
-            format_func=lambda x: next((p[1] for p in patient_options if p[0] == x), f"Patient {x}")
+            options=list(patient_options),
+            format_func=lambda x: patient_options.get(x, f"Patient {x}")
         )
         
         # Get patient details
@@ -52,24 +63,71 @@ def show():
             </div>
             """, unsafe_allow_html=True)
         
-        # Fetch patient-specific history
-        patient_history = get_patient_detection_history(selected_patient_id)
-        
-        if not patient_history:
-            st.info(f"No detection history available for this patient.")
-            return
-        
         st.subheader(f"Detection History")
-        display_patient_history(patient_history)
+        display_patient_history(selected_patient_id)
+
+def combine_diagnosis_filters(risk_diagnoses, diagnosis_filter):
+    """Intersect the risk-derived and explicit diagnosis filters"""
+    if risk_diagnoses is None:
+        return diagnosis_filter or None
+    if not diagnosis_filter:
+        return risk_diagnoses
+    return [d for d in diagnosis_filter if d in risk_diagnoses]
+
+def fetch_page(key, filters):
+    """Fetch the current keyset page for these filters and render the pager controls.
+
+    The cursors of visited pages are kept in session state so Previous works
+    without OFFSET; changing a filter starts again from the first page.
+    """
+    state_key = f"{key}_pager"
+    signature = repr(sorted(filters.items()))
+    pager = st.session_state.get(state_key)
+    if pager is None or pager['signature'] != signature:
+        pager = {'signature': signature, 'cursors': [None], 'page': 0}
+        st.session_state[state_key] = pager
 
-def display_patient_history(history):
+    rows, next_cursor = get_detection_history_page(
+        cursor=pager['cursors'][pager['page']], page_size=PAGE_SIZE, **filters
+    )
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("← Previous", key=f"{key}_prev", disabled=pager['page'] == 0):
+            pager['page'] -= 1
+            st.rerun()
+    with col2:
+        st.markdown(f"<p style='text-align: center;'>Page {pager['page'] + 1}</p>", unsafe_allow_html=True)
+    with col3:
+        if st.button("Next →", key=f"{key}_next", disabled=next_cursor is None):
+            del pager['cursors'][pager['page'] + 1:]
+            pager['cursors'].append(next_cursor)
+            pager['page'] += 1
+            st.rerun()
+
+    return rows
+
+def display_patient_history(patient_id):
     """Display detection history for a specific patient"""
-    model = SkinCancerModel()
+    # Add filtering options
+    risk_filter = st.multiselect("Filter by Risk Level", 
+                               options=RISK_LEVELS,
+                               default=[])
+    
+    filters = {
+        'patient_id': patient_id,
+        'diagnoses': diagnoses_for_risk(risk_filter)
+    }
+    history = fetch_page(f"patient_{patient_id}_history", filters)
     
-    # Create a DataFrame for better display
+    if not history:
+        st.info("No detection history matches the selected filters.")
+        return
+    
+    # Create a DataFrame for this page only
     history_data = []
     for record in history:
-        class_info = model.get_class_info(record['diagnosis'])
+        class_info = resolve_class_info(record['diagnosis'])
         history_data.append({
             'ID': record['id'],
             'Diagnosis': class_info['name'],
@@ -80,76 +138,73 @@ def display_patient_history(history):
             'Notes': record['notes'] if record['notes'] else "N/A"
         })
     
-    # Convert to DataFrame
     df = pd.DataFrame(history_data)
+    st.dataframe(df, use_container_width=True)
     
-    # Add filtering options
-    risk_filter = st.multiselect("Filter by Risk Level", 
-                               options=["Low", "Medium", "High", "Very High"],
-                               default=[])
-    
-    # Apply filters
-    filtered_df = df
-    if risk_filter:
-        filtered_df = filtered_df[filtered_df['Risk'].isin(risk_filter)]
+    # Allow detailed view of selected record
+    records_by_id = {r['id']: r for r in history}
+    selected_id = st.selectbox("Select record to view details", 
+                             options=list(records_by_id),
+                             format_func=lambda x: f"Record {x} - {records_by_id[x]['created_at']}")
     
-    # Display table
-    if not filtered_df.empty:
-        st.dataframe(filtered_df, use_container_width=True)
-        
-        # Allow detailed view of selected record
-        selected_id = st.selectbox("Select record to view details", 
-                                 options=filtered_df['ID'].tolist(),
-                                 format_func=lambda x: f"Record {x} - {filtered_df[filtered_df['ID'] == x]['Date'].values[0]}")
-        
-        if selected_id:
-            record = next((r for r in history if r['id'] == selected_id), None)
-            if record:
-                st.subheader(f"Test Details (ID: {selected_id})")
-                col1, col2 = st.columns([1, 2])
-                
-                with col1:
-                    try:
-                        st.image(record['image_path'], caption="Analyzed Image", width=200)
-                    except:
-                        st.error("Image not found")
-                
-                with col2:
-                    class_info = model.get_class_info(record['diagnosis'])
-                    
-                    st.markdown(f"""
-                    <div class="card">
-                        <h3>Diagnosis: {class_info['name']}</h3>
-                        <p><strong>Confidence:</strong> {record['confidence'] * 100:.1f}%</p>
-                        <p><strong>Risk Level:</strong> {class_info['info']['risk_level']}</p>
-                        <p><strong>Location:</strong> {record['lesion_location']}</p>
-                        <p><strong>Date:</strong> {record['created_at']}</p>
-                    </div>
-                    
-                    <div class="{get_result_class(class_info['info']['risk_level'])}">
-                        <h4>Recommendation:</h4>
-                        <p>{class_info['info']['recommendation']}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    if record['notes']:
-                        st.markdown(f"""
-                        <div class="info-panel">
-                            <h4>Notes:</h4>
-                            <p>{record['notes']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-    else:
-        st.info("No records match the selected filters.")
+    if selected_id:
+        record = records_by_id[selected_id]
+        st.subheader(f"Test Details (ID: {selected_id})")
+        display_record_details(record)
 
-def display_all_history(history):
+def display_all_history():
     """Display detection history for all patients"""
-    model = SkinCancerModel()
+    # Filter options come from small lookup queries, not the full history
+    diagnosis_options = {code: resolve_class_info(code)['name'] for code in get_detection_diagnoses()}
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        risk_filter = st.multiselect("Filter by Risk Level", 
+                                   options=RISK_LEVELS,
+                                   default=[])
+    with col2:
+        diagnosis_filter = st.multiselect("Filter by Diagnosis", 
+                                        options=list(diagnosis_options),
+                                        format_func=lambda x: diagnosis_options.get(x, x),
+                                        default=[])
+    with col3:
+        # Patient options are search matches plus the patients already picked
+        selected_patients = st.session_state.setdefault('history_patient_filter', {})
+        patient_search = st.text_input("Find patients to filter by")
+        patient_options = dict(selected_patients)
+        if patient_search:
+            patient_options.update((p['id'], p['name']) for p in search_patients(patient_search, limit=PAGE_SIZE))
+        patient_filter = st.multiselect("Filter by Patient", 
+                                      options=list(patient_options),
+                                      format_func=lambda x: patient_options.get(x, f"Patient {x}"),
+                                      default=list(selected_patients))
+        st.session_state['history_patient_filter'] = {pid: patient_options[pid] for pid in patient_filter}
     
-    # Create a DataFrame for better display
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        date_from = st.date_input("From date", value=None)
+    with col2:
+        date_to = st.date_input("To date", value=None)
+    with col3:
+        notes_query = st.text_input("Search notes")
+    
+    filters = {
+        'patient_ids': patient_filter or None,
+        'diagnoses': combine_diagnosis_filters(diagnoses_for_risk(risk_filter), diagnosis_filter),
+        'date_from': date_from,
+        'date_to': date_to,
+        'notes_query': notes_query or None
+    }
+    history = fetch_page("all_history", filters)
+    
+    if not history:
+        st.info("No records match the selected filters.")
+        return
+    
+    # Create a DataFrame for this page only
     history_data = []
     for record in history:
-        class_info = model.get_class_info(record['diagnosis'])
+        class_info = resolve_class_info(record['diagnosis'])
         history_data.append({
             'ID': record['id'],
             'Patient': record['patient_name'] if record['patient_name'] else f"Patient {record['patient_id']}",
@@ -161,89 +216,64 @@ def display_all_history(history):
             'Notes': record['notes'] if record['notes'] else "N/A"
         })
     
-    # Convert to DataFrame
     df = pd.DataFrame(history_data)
+    st.dataframe(df, use_container_width=True)
     
-    # Add filtering options
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        risk_filter = st.multiselect("Filter by Risk Level", 
-                                   options=["Low", "Medium", "High", "Very High"],
-                                   default=[])
-    with col2:
-        diagnosis_filter = st.multiselect("Filter by Diagnosis", 
-                                        options=list(set([d['Diagnosis'] for d in history_data])),
-                                        default=[])
-    with col3:
-        patient_filter = st.multiselect("Filter by Patient", 
-                                      options=list(set([d['Patient'] for d in history_data])),
-                                      default=[])
+    # Allow detailed view of selected record
+    patient_names = {row['ID']: row['Patient'] for row in history_data}
+    records_by_id = {r['id']: r for r in history}
+    selected_id = st.selectbox("Select record to view details", 
+                             options=list(records_by_id),
+                             format_func=lambda x: f"Record {x} - {patient_names[x]}")
+    
+    if selected_id:
+        record = records_by_id[selected_id]
+        st.subheader(f"Details for {patient_names[selected_id]}")
+        display_record_details(record)
+
+def display_record_details(record):
+    """Show image, diagnosis card and notes for one detection record"""
+    col1, col2 = st.columns([1, 2])
     
-    # Apply filters
-    filtered_df = df
-    if risk_filter:
-        filtered_df = filtered_df[filtered_df['Risk'].isin(risk_filter)]
-    if diagnosis_filter:
-        filtered_df = filtered_df[filtered_df['Diagnosis'].isin(diagnosis_filter)]
-    if patient_filter:
-        filtered_df = filtered_df[filtered_df['Patient'].isin(patient_filter)]
+    with col1:
+        try:
+            st.image(get_derivative(record['image_path'], 'thumb'), caption="Analyzed Image", width=200)
+        except:
+            st.error("Image not found")
     
-    # Display table
-    if not filtered_df.empty:
-        st.dataframe(filtered_df, use_container_width=True)
+    with col2:
+        class_info = resolve_class_info(record['diagnosis'])
         
-        # Allow detailed view of selected record
-        selected_id = st.selectbox("Select record to view details", 
-                                 options=filtered_df['ID'].tolist(),
-                                 format_func=lambda x: f"Record {x} - {filtered_df[filtered_df['ID'] == x]['Patient'].values[0]}")
+        st.markdown(f"""
+        <div class="card">
+            <h3>Diagnosis: {class_info['name']}</h3>
+            <p><strong>Confidence:</strong> {record['confidence'] * 100:.1f}%</p>
+            <p><strong>Risk Level:</strong> {class_info['info']['risk_level']}</p>
+            <p><strong>Location:</strong> {record['lesion_location']}</p>
+            <p><strong>Date:</strong> {record['created_at']}</p>
+        </div>
         
-        if selected_id:
-            record = next((r for r in history if r['id'] == selected_id), None)
-            if record:
-                st.subheader(f"Details for {filtered_df[filtered_df['ID'] == selected_id]['Patient'].values[0]}")
-                col1, col2 = st.columns([1, 2])
-                
-                with col1:
-                    try:
-                        st.image(record['image_path'], caption="Analyzed Image", width=200)
-                    except:
-                        st.error("Image not found")
-                
-                with col2:
-                    class_info = model.get_class_info(record['diagnosis'])
-                    
-                    st.markdown(f"""
-                    <div class="card">
-                        <h3>Diagnosis: {class_info['name']}</h3>
-                        <p><strong>Confidence:</strong> {record['confidence'] * 100:.1f}%</p>
-                        <p><strong>Risk Level:</strong> {class_info['info']['risk_level']}</p>
-                        <p><strong>Location:</strong> {record['lesion_location']}</p>
-                        <p><strong>Date:</strong> {record['created_at']}</p>
-                    </div>
-                    
-                    <div class="{get_result_class(class_info['info']['risk_level'])}">
-                        <h4>Recommendation:</h4>
-                        <p>{class_info['info']['recommendation']}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    if record['notes']:
-                        st.markdown(f"""
-                        <div class="info-panel">
-                            <h4>Notes:</h4>
-                            <p>{record['notes']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-    else:
-        st.info("No records match the selected filters.")
+        <div class="{get_result_class(class_info['info']['risk_level'])}">
+            <h4>Recommendation:</h4>
+            <p>{class_info['info']['recommendation']}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        if record['notes']:
+            st.markdown(f"""
+            <div class="info-panel">
+                <h4>Notes:</h4>
+                <p>{record['notes']}</p>
+            </div>
+            """, unsafe_allow_html=True)
 
 def get_result_class(risk_level):
     """Return CSS class based on risk level"""
-    if risk_level == "Low":
+    if risk_level in ("Very Low", "Low"):
         return "result-low"
-    elif risk_level == "Medium":
+    elif risk_level in ("Medium-Low", "Medium"):
         return "result-medium"
-    elif risk_level == "High":
+    elif risk_level in ("Medium-High", "High"):
         return "result-high"
     elif risk_level == "Very High":
         return "result-very-high"
@@ -1,9 +1,4 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import io
-import base64
-import numpy as np
 import os
 
 def show():
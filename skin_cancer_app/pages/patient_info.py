@@ -1,5 +1,33 @@
 import streamlit as st
-from utils.db_manager import add_patient, get_patient, get_all_patients
+import pandas as pd
+from utils.db_manager import add_patient, get_patient, get_patients_page, search_patients
+
+# Number of patients listed per page
+PAGE_SIZE = 25
+
+def fetch_patient_page():
+    """Fetch the current keyset page of patients and render the pager controls.
+
+    Visited page cursors are kept in session state so Previous works without OFFSET.
+    """
+    pager = st.session_state.setdefault('patient_pager', {'cursors': [None], 'page': 0})
+    rows, next_cursor = get_patients_page(cursor=pager['cursors'][pager['page']], page_size=PAGE_SIZE)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("← Previous", key="patients_prev", disabled=pager['page'] == 0):
+            pager['page'] -= 1
+            st.rerun()
+    with col2:
+        st.markdown(f"<p style='text-align: center;'>Page {pager['page'] + 1}</p>", unsafe_allow_html=True)
+    with col3:
+        if st.button("Next →", key="patients_next", disabled=next_cursor is None):
+            del pager['cursors'][pager['page'] + 1:]
+            pager['cursors'].append(next_cursor)
+            pager['page'] += 1
+            st.rerun()
+
+    return rows
 
 def show():
     """Display the patient information page"""
@@ -68,57 +96,53 @@ def show():
     with tab2:
         st.subheader("Select Existing Patient")
 
-        # Get all patients
-        patients = get_all_patients()
+        # Search functionality (full-text index, matches word prefixes)
+        search_query = st.text_input("Search patients by name, contact, address or medical history")
 
-        if not patients:
-            st.info("No patients registered yet. Please register a new patient.")
+        if search_query:
+            # Best matches first, one page's worth
+            patients = search_patients(search_query, limit=PAGE_SIZE)
+            st.markdown(f"Showing the {len(patients)} best matching patients")
         else:
-            # Search functionality
-            search_query = st.text_input("Search patients by name")
+            patients = fetch_patient_page()
 
-            # Filter patients based on search query
+        if not patients:
             if search_query:
-                filtered_patients = [p for p in patients if search_query.lower() in p['name'].lower()]
+                st.info("No patients match your search.")
             else:
-                filtered_patients = patients
-
-            # Display patients as cards
-            st.markdown(f"Found {len(filtered_patients)} patients")
-
-            for i, patient in enumerate(filtered_patients):
-                with st.form(f"select_patient_form_{i}"):
-                    col1, col2, col3 = st.columns([3, 2, 1])
-
-                    with col1:
-                        st.markdown(f"""
-                        <div class="card">
-                            <h3>{patient['name']}</h3>
-                            <p><strong>ID:</strong> {patient['id']}</p>
-                            <p><strong>Age:</strong> {patient['age']} | <strong>Gender:</strong> {patient['gender']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    with col2:
-                        st.markdown(f"""
-                        <div class="info-panel">
-                            <p><strong>Contact:</strong> {patient['contact'] or 'N/A'}</p>
-                            <p><strong>Registered:</strong> {patient['created_at']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                    with col3:
-                        select_button = st.form_submit_button("Select")
-                        view_details_button = st.form_submit_button("View Details")
-                    
-                    if select_button:
-                        st.session_state.patient_id = patient['id']
-                        st.success(f"Selected patient: {patient['name']}")
-                        st.session_state['selected_existing_patient'] = True
-
-                    if view_details_button:
-                        st.session_state['view_patient_id'] = patient['id']
-                        st.rerun()
+                st.info("No patients registered yet. Please register a new patient.")
+        else:
+            # One table and one selection widget per page, regardless of patient count
+            patients_by_id = {p['id']: p for p in patients}
+            st.dataframe(pd.DataFrame([{
+                'ID': p['id'],
+                'Name': p['name'],
+                'Age': p['age'],
+                'Gender': p['gender'],
+                'Contact': p['contact'] or 'N/A',
+                'Registered': p['created_at']
+            } for p in patients]), use_container_width=True, hide_index=True)
+
+            with st.form("select_patient_form"):
+                selected_id = st.selectbox(
+                    "Patient",
+                    options=list(patients_by_id),
+                    format_func=lambda x: f"{patients_by_id[x]['name']} (ID: {x})"
+                )
+                col1, col2 = st.columns(2)
+                with col1:
+                    select_button = st.form_submit_button("Select")
+                with col2:
+                    view_details_button = st.form_submit_button("View Details")
+
+            if select_button:
+                st.session_state.patient_id = selected_id
+                st.success(f"Selected patient: {patients_by_id[selected_id]['name']}")
+                st.session_state['selected_existing_patient'] = True
+
+            if view_details_button:
+                st.session_state['view_patient_id'] = selected_id
+                st.rerun()
 
             # Navigation to detection after selecting a patient
             if st.session_state.get('selected_existing_patient', False):
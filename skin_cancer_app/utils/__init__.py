@@ -1,20 +1,48 @@
 # utils/__init__.py
 
-# Import all utility modules for easier access
-from utils.model_handler import SkinCancerModel, SKIN_CLASSES
-from utils.image_processor import enhance_image, segment_lesion, get_image_features, create_analysis_plots
+# Utility names are resolved lazily on first access so that importing `utils`
+# (or any light submodule such as db_manager) does not pull in TensorFlow/cv2.
+import importlib
 
-from utils.db_manager import (
-    init_db, 
-    add_patient, 
-    get_patient, 
-    get_all_patients, 
-    update_patient, 
-    add_detection_record, 
-    get_patient_detection_history, 
-    get_all_detection_history
-)
-from utils.chatbot_utils import get_chatbot_response, preprocess_query, get_faq_response
+_LAZY_EXPORTS = {
+    'utils.model_handler': [
+        'SkinCancerModel', 'SKIN_CLASSES', 'get_shared_model', 'warm_up_models',
+        'get_model_stats', 'get_micro_batcher'
+    ],
+    'utils.image_processor': [
+        'ImageContext', 'enhance_image', 'segment_lesion', 'get_image_features',
+        'embed_images', 'create_analysis_plots', 'lesion_features', 'batch_lesion_features'
+    ],
+    'utils.result_cache': ['ResultCache', 'get_result_cache', 'hash_image_file'],
+    'utils.db_manager': [
+        'init_db',
+        'get_connection',
+        'transaction',
+        'add_patient',
+        'get_patient',
+        'get_all_patients',
+        'get_patients_page',
+        'update_patient',
+        'add_detection_record',
+        'get_patient_detection_history',
+        'get_all_detection_history',
+        'get_detection_history_page',
+        'search_patients'
+    ],
+    'utils.chatbot_utils': ['get_chatbot_response', 'preprocess_query', 'normalize_query', 'get_faq_response'],
+}
+
+_EXPORT_MODULES = {name: module for module, names in _LAZY_EXPORTS.items() for name in names}
+
+__all__ = list(_EXPORT_MODULES)
+
+def __getattr__(name):
+    module_name = _EXPORT_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'utils' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
 
 # Version information
 __version__ = '1.0.0'
@@ -0,0 +1,166 @@
+import os
+import time
+import argparse
+import threading
+
+from utils.result_cache import hash_bytes, hash_image_file
+
+# Uploaded images, stored once per unique content as <root>/<h[:2]>/<h[2:4]>/<hash>.<ext>
+UPLOAD_DIR = os.path.join('data', 'uploaded_images')
+
+# Unreferenced blobs younger than this are kept: an upload is stored before its
+# detection row is saved
+GC_GRACE_SECONDS = 24 * 60 * 60
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def normalize_extension(filename):
+    """Lower-case extension of filename, with .jpeg folded into .jpg"""
+    ext = os.path.splitext(filename)[1].lower()
+    return '.jpg' if ext == '.jpeg' else ext
+
+class BlobStore:
+    """Content-addressed image store with sharded directories.
+
+    Each unique image is written once, atomically (temp file + rename), under a
+    path derived from its SHA-256. detection_results.image_path holds blob paths,
+    so the number of rows referencing a blob is its reference count.
+    """
+
+    def __init__(self, root=UPLOAD_DIR):
+        self.root = root
+
+    def path_for(self, digest, ext):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{ext}")
+
+    def is_blob(self, path):
+        """Whether path is a blob inside this store (as opposed to a legacy flat upload)"""
+        rel = os.path.relpath(path, self.root)
+        parts = rel.split(os.sep)
+        stem = os.path.splitext(parts[-1])[0]
+        return len(parts) == 3 and len(stem) == 64 and stem.startswith(parts[0] + parts[1])
+
+    @staticmethod
+    def _write_atomic(path, chunks):
+        """Write chunks to a temp file next to path and rename it into place"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put(self, data, filename='', digest=None):
+        """Store image bytes and return their blob path; existing content is not rewritten.
+
+        Pass digest when the caller already hashed data.
+        """
+        path = self.path_for(digest or hash_bytes(data), normalize_extension(filename))
+        if os.path.exists(path):
+            # Re-uploads restart the GC grace period, like a fresh write would
+            os.utime(path)
+        else:
+            self._write_atomic(path, [data])
+        return path
+
+    def put_file(self, source_path):
+        """Store an existing file and return its blob path"""
+        path = self.path_for(hash_image_file(source_path), normalize_extension(source_path))
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            with open(source_path, 'rb') as src:
+                self._write_atomic(path, iter(lambda: src.read(1024 * 1024), b''))
+        return path
+
+    def iter_blobs(self):
+        """Yield the path of every blob in the store"""
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if not filename.endswith('.tmp') and self.is_blob(path):
+                    yield path
+
+    def reference_counts(self, paths=None):
+        """{blob path: number of detection rows referencing it}"""
+        from utils.db_manager import count_image_references
+        return count_image_references(list(paths) if paths is not None else list(self.iter_blobs()))
+
+    def collect_garbage(self, grace_seconds=GC_GRACE_SECONDS):
+        """Delete blobs no detection references and that are older than the grace period"""
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for path, count in self.reference_counts().items():
+            if count == 0 and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                # Derivatives (thumbnails, previews) live beside the blob as <hash>_<variant>
+                directory, stem = os.path.dirname(path), os.path.splitext(os.path.basename(path))[0]
+                for sibling in os.listdir(directory):
+                    if sibling.startswith(f"{stem}_"):
+                        os.remove(os.path.join(directory, sibling))
+                removed += 1
+        return removed
+
+    def import_legacy_uploads(self):
+        """Move flat {timestamp}_{name} uploads into the store, merging duplicates.
+
+        Detection rows are repointed at the blob paths before the flat files are
+        removed. Returns (files imported, unique blobs).
+        """
+        from utils.db_manager import replace_image_paths
+        from utils.derivatives import DERIVATIVE_SIZES, derivative_path, is_derivative
+
+        if not os.path.isdir(self.root):
+            return 0, 0
+        path_map = {}
+        for entry in os.scandir(self.root):
+            if (entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+                    and not is_derivative(entry.name)):
+                legacy_path = os.path.join(self.root, entry.name)
+                path_map[legacy_path] = self.put_file(legacy_path)
+        replace_image_paths(path_map)
+
+        for legacy_path in path_map:
+            for variant in DERIVATIVE_SIZES:
+                if os.path.exists(derivative_path(legacy_path, variant)):
+                    os.remove(derivative_path(legacy_path, variant))
+            os.remove(legacy_path)
+        return len(path_map), len(set(path_map.values()))
+
+# Process-wide store instance
+_blob_store = None
+_blob_store_lock = threading.Lock()
+
+def get_blob_store():
+    """Get the shared upload blob store"""
+    global _blob_store
+    if _blob_store is None:
+        with _blob_store_lock:
+            if _blob_store is None:
+                _blob_store = BlobStore()
+    return _blob_store
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the uploaded image store")
+    parser.add_argument("command", choices=["import", "gc"],
+                        help="import: move legacy flat uploads into the store; gc: delete unreferenced blobs")
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_SECONDS / 3600,
+                        help="Keep unreferenced blobs younger than this (gc only)")
+    args = parser.parse_args()
+
+    store = get_blob_store()
+    if args.command == "import":
+        imported, unique = store.import_legacy_uploads()
+        print(f"Imported {imported} uploads as {unique} blobs")
+    else:
+        removed = store.collect_garbage(args.grace_hours * 3600)
+        print(f"Removed {removed} unreferenced blobs")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,66 @@
 import re
+import math
 import random
 import json
 import os
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+FAQ_PATH = os.path.join('assets', 'metadata', 'faq_data.json')
+
+# Domain terms that add a bonus when shared by the query and an FAQ question
+SKIN_CANCER_TERMS = ["melanoma", "basal", "carcinoma", "squamous", "skin", "cancer",
+                     "mole", "lesion", "sunscreen", "spf", "uv", "abcde"]
+
+GREETINGS = frozenset(["hello", "hi", "hey", "greetings"])
+
+# Substring terms per category; checked together by one combined pattern
+MATCH_TERMS = {
+    "app": ["skinscan", "app", "application"],
+    "how": ["how"],
+    "usage": ["use", "work"],
+    "accurate": ["accurate"],
+    "nav_detection": ["detection", "analyze", "scan", "upload", "image", "photo"],
+    "nav_patient_info": ["patient", "information", "profile", "register"],
+    "nav_history": ["history", "previous", "past", "record"]
+}
+for _term in SKIN_CANCER_TERMS:
+    MATCH_TERMS[f"domain_{_term}"] = [_term]
+
+# Navigation categories in priority order
+NAVIGATION_CATEGORIES = [("nav_detection", "detection"), ("nav_patient_info", "patient_info"), ("nav_history", "history")]
+
+def _compile_matcher(match_terms):
+    """One regex that, at every position, tries each category in an optional lookahead.
+
+    Scanning the text once with finditer reports every category whose term
+    occurs anywhere, including overlapping terms (e.g. "scan" inside "skinscan").
+    """
+    lookaheads = []
+    for category, terms in match_terms.items():
+        alternatives = '|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+        lookaheads.append(f"(?=(?P<{category}>{alternatives}))?")
+    return re.compile(''.join(lookaheads))
+
+_MATCHER = _compile_matcher(MATCH_TERMS)
+
+NormalizedQuery = namedtuple("NormalizedQuery", ["text", "tokens", "categories"])
+
+def normalize_query(query):
+    """Normalize a query once and find every term category it contains in a single pass"""
+    if isinstance(query, NormalizedQuery):
+        return query
+    text = preprocess_query(query)
+    categories = set()
+    for match in _MATCHER.finditer(text):
+        categories.update(name for name, value in match.groupdict().items() if value)
+    return NormalizedQuery(text, frozenset(text.split()), frozenset(categories))
 
 # Load FAQ data
 def load_faq_data():
     """Load FAQ data from JSON file, or return default data if file not found"""
     try:
-        with open(os.path.join('assets', 'metadata', 'faq_data.json'), 'r') as f:
+        with open(FAQ_PATH, 'r') as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         # Return default FAQ data if file not found or invalid
@@ -46,14 +99,25 @@ def load_faq_data():
             }
         }
 
-# FAQ data cache
+# FAQ data cache, reloaded when faq_data.json changes on disk
 _faq_data = None
+_faq_mtime = None
+_faq_index = None
+
+def _faq_file_mtime():
+    try:
+        return os.path.getmtime(FAQ_PATH)
+    except OSError:
+        return None
 
 def get_faq_data():
     """Get FAQ data with caching"""
-    global _faq_data
-    if _faq_data is None:
+    global _faq_data, _faq_mtime, _faq_index
+    mtime = _faq_file_mtime()
+    if _faq_data is None or mtime != _faq_mtime:
         _faq_data = load_faq_data()
+        _faq_mtime = mtime
+        _faq_index = None
     return _faq_data
 
 def preprocess_query(query):
@@ -63,66 +127,111 @@ def preprocess_query(query):
     query = ' '.join(query.split())  # Remove extra whitespace
     return query
 
-def get_best_match_faq(query):
-    """Find the best matching FAQ for a query"""
-    preprocessed_query = preprocess_query(query)
+class FaqIndex:
+    """Inverted index over the FAQ questions with IDF term weights.
+
+    A document's score is the IDF-weighted share of query terms it contains
+    (so common words like "what" count for little) plus a bonus for every
+    shared skin-cancer term. Only FAQs sharing at least one term are scored.
+    """
+
+    def __init__(self, faqs):
+        self.faqs = faqs
+        self.postings = defaultdict(list)
+        # Skin-cancer term -> FAQs whose question contains it (substring, as in normalize_query)
+        self.domain_postings = defaultdict(list)
+
+        for doc_id, faq in enumerate(faqs):
+            question = preprocess_query(faq["question"])
+            for term in set(question.split()):
+                self.postings[term].append(doc_id)
+            for term in SKIN_CANCER_TERMS:
+                if term in question:
+                    self.domain_postings[term].append(doc_id)
+
+        n_docs = len(faqs)
+        self.idf = {term: math.log((n_docs + 1) / (len(docs) + 1)) + 1.0 for term, docs in self.postings.items()}
+        # Unknown query words still dilute the score, at the highest weight
+        self.unknown_idf = math.log(n_docs + 1) + 1.0
+
+    def search(self, query):
+        """Return (best FAQ, score) for a query string or NormalizedQuery, or (None, 0) if nothing overlaps"""
+        normalized = normalize_query(query)
+        query_terms = normalized.tokens
+        if not query_terms:
+            return None, 0
+
+        total_weight = sum(self.idf.get(term, self.unknown_idf) for term in query_terms)
+        scores = defaultdict(float)
+        for term in query_terms:
+            weight = self.idf.get(term)
+            if weight is None:
+                continue
+            for doc_id in self.postings[term]:
+                scores[doc_id] += weight / total_weight
+
+        # Domain bonus: only FAQs posted under a shared skin-cancer term are touched
+        for term in SKIN_CANCER_TERMS:
+            if f"domain_{term}" in normalized.categories:
+                for doc_id in self.domain_postings.get(term, ()):
+                    scores[doc_id] += 0.2
+
+        if not scores:
+            return None, 0
+        best_doc = max(scores, key=scores.get)
+        return self.faqs[best_doc], scores[best_doc]
+
+def get_faq_index():
+    """Get the FAQ index, rebuilding it only when the FAQ data was reloaded"""
+    global _faq_index
     faq_data = get_faq_data()
+    if _faq_index is None:
+        _faq_index = FaqIndex(faq_data["faqs"])
+    return _faq_index
 
-    best_match = None
-    best_score = 0
-
-    for faq in faq_data["faqs"]:
-        faq_question = preprocess_query(faq["question"])
-        words_in_query = set(preprocessed_query.split())
-        words_in_faq = set(faq_question.split())
-        common_words = words_in_query.intersection(words_in_faq)
-
-        score = len(common_words) / len(words_in_query) if words_in_query else 0
-
-        skin_cancer_terms = ["melanoma", "basal", "carcinoma", "squamous", "skin", "cancer",
-                             "mole", "lesion", "sunscreen", "spf", "uv", "abcde"]
-        for term in skin_cancer_terms:
-            if term in preprocessed_query and term in faq_question:
-                score += 0.2
-
-        if score > best_score:
-            best_score = score
-            best_match = faq
-
+def get_best_match_faq(query):
+    """Find the best matching FAQ for a query"""
+    best_match, best_score = get_faq_index().search(query)
     return best_match["answer"] if best_score > 0.4 else None
 
 def get_navigation_help(query):
     """Provide navigation help based on user query"""
-    preprocessed_query = preprocess_query(query)
+    normalized = normalize_query(query)
     faq_data = get_faq_data()
 
-    navigation_terms = {
-        "detection": ["detection", "analyze", "scan", "upload", "image", "photo"],
-        "patient_info": ["patient", "information", "profile", "register"],
-        "history": ["history", "previous", "past", "record"]
-    }
-
-    for nav_type, terms in navigation_terms.items():
-        if any(term in preprocessed_query for term in terms):
+    for category, nav_type in NAVIGATION_CATEGORIES:
+        if category in normalized.categories:
             return faq_data["navigation_help"].get(nav_type, "Use the navigation menu to explore the app.")
 
     return None
 
-def get_faq_response(query):
-    """Get response from FAQ database"""
-    response = get_best_match_faq(query)
-    return response if response else get_navigation_help(query) or random.choice(get_faq_data()["general_responses"])
-
-def get_chatbot_response(query):
-    """Generate a response for the user query"""
-    greetings = ["hello", "hi", "hey", "greetings"]
-    if preprocess_query(query) in greetings:
+def _match_response(normalized):
+    """Deterministic response for a normalized query, or None to fall back to a general reply"""
+    if normalized.text in GREETINGS:
         return "Hello! How can I help you with skin cancer information or using the SkinScan app today?"
 
-    if any(term in preprocess_query(query) for term in ["skinscan", "app", "application"]):
-        if "how" in query.lower() and any(word in query.lower() for word in ["use", "work"]):
+    categories = normalized.categories
+    if "app" in categories:
+        if "how" in categories and "usage" in categories:
             return "SkinScan works by analyzing images of skin lesions using AI. Upload an image in the Detection page to get a result."
-        if "accurate" in query.lower():
+        if "accurate" in categories:
             return "SkinScan achieves around 85-90% accuracy on validation datasets, but should be used as a supportive tool for doctors."
 
-    return get_faq_response(query)
+    return get_best_match_faq(normalized) or get_navigation_help(normalized)
+
+@lru_cache(maxsize=1024)
+def _cached_response(normalized_text, faq_version):
+    # faq_version is part of the key so edits to faq_data.json invalidate old answers
+    return _match_response(normalize_query(normalized_text))
+
+def get_faq_response(query):
+    """Get response from FAQ database"""
+    normalized = normalize_query(query)
+    response = get_best_match_faq(normalized)
+    return response if response else get_navigation_help(normalized) or random.choice(get_faq_data()["general_responses"])
+
+def get_chatbot_response(query):
+    """Generate a response for the user query"""
+    get_faq_data()  # Refresh the FAQ version if the file changed
+    response = _cached_response(preprocess_query(query), _faq_mtime)
+    return response if response else random.choice(get_faq_data()["general_responses"])
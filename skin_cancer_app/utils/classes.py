@@ -0,0 +1,83 @@
+# Diagnosis classes shown by the detection page, reports and exports
+SKIN_CLASSES = {
+    "melanoma": "Melanoma",
+    "basal_cell_carcinoma": "Basal Cell Carcinoma",
+    "squamous_cell_carcinoma": "Squamous Cell Carcinoma",
+    "actinic_keratosis": "Actinic Keratosis",
+    "nevus": "Benign Nevus (Mole)",
+    "seborrheic_keratosis": "Seborrheic Keratosis",
+    "dermatofibroma": "Dermatofibroma"
+}
+
+CLASS_INFO = {
+    "melanoma": {
+        "risk_level": "High",
+        "description": "Melanoma is the most dangerous form of skin cancer. It develops in melanocytes, the cells that produce melanin. Melanomas often resemble moles and some develop from moles.",
+        "recommendation": "Immediate referral to a dermatologist for biopsy and treatment planning. Melanoma can be life-threatening if not treated early."
+    },
+    "basal_cell_carcinoma": {
+        "risk_level": "Medium",
+        "description": "Basal cell carcinoma is the most common form of skin cancer. It rarely spreads to other parts of the body but can be locally destructive if not treated.",
+        "recommendation": "Referral to a dermatologist for removal. Various treatment options include surgical excision, Mohs surgery, or topical medications."
+    },
+    "squamous_cell_carcinoma": {
+        "risk_level": "Medium-High",
+        "description": "Squamous cell carcinoma is the second most common form of skin cancer. It's more likely to spread than basal cell carcinoma but still has a good prognosis when caught early.",
+        "recommendation": "Prompt referral to a dermatologist for biopsy and treatment. May require excision, radiation therapy, or topical treatments."
+    },
+    "actinic_keratosis": {
+        "risk_level": "Medium-Low",
+        "description": "Actinic keratosis is a precancerous lesion that may develop into squamous cell carcinoma if left untreated. It appears as a rough, scaly patch on skin frequently exposed to the sun.",
+        "recommendation": "Dermatologist evaluation within 1-2 months. Treatment options include cryotherapy, topical medications, or photodynamic therapy."
+    },
+    "nevus": {
+        "risk_level": "Low",
+        "description": "A benign nevus (mole) is a common growth on the skin that develops when pigment cells grow in clusters. Most are harmless, but some may develop into melanoma.",
+        "recommendation": "Regular self-monitoring for changes in size, shape, color, or symptoms. Follow up with dermatologist during regular skin checks."
+    },
+    "seborrheic_keratosis": {
+        "risk_level": "Low",
+        "description": "Seborrheic keratosis is a benign skin growth that appears as a waxy, scaly, slightly raised growth. They are very common and not cancerous.",
+        "recommendation": "No treatment necessary unless for cosmetic reasons or if the lesion becomes irritated. Can be removed by freezing, curettage, or laser therapy if desired."
+    },
+    "dermatofibroma": {
+        "risk_level": "Low",
+        "description": "Dermatofibroma is a common benign skin growth that often appears as a small, firm bump. They are usually asymptomatic and harmless.",
+        "recommendation": "No treatment necessary. Can be monitored for changes. Removal is an option if the lesion is bothersome or for cosmetic reasons."
+    }
+}
+
+# Risk levels used by either class table, lowest first
+RISK_LEVELS = ["Very Low", "Low", "Medium-Low", "Medium", "Medium-High", "High"]
+
+def iter_class_info():
+    """(code, name, info) for every diagnosis code a detection row can hold.
+
+    Rows saved by the detection page use the codes above; rows from the
+    HAM10000 model use utils.model_handler's codes (mel, bcc, ...).
+    """
+    from utils.model_handler import SKIN_CLASSES as MODEL_CLASSES, CLASS_INFO as MODEL_CLASS_INFO
+    for classes, class_info in ((MODEL_CLASSES, MODEL_CLASS_INFO), (SKIN_CLASSES, CLASS_INFO)):
+        for code, name in classes.items():
+            yield code, name, class_info[code]
+
+def resolve_class_info(diagnosis):
+    """Class name and info for a stored diagnosis code from either class table"""
+    for code, name, info in iter_class_info():
+        if code == diagnosis:
+            return {'name': name, 'info': info}
+
+    return {
+        'name': diagnosis or "Unknown",
+        'info': {
+            'description': 'Information not available',
+            'risk_level': 'Unknown',
+            'recommendation': 'Please consult a medical professional'
+        }
+    }
+
+def diagnoses_for_risk(risk_levels):
+    """Diagnosis codes from both class tables whose risk level is in risk_levels (None when not filtering)"""
+    if not risk_levels:
+        return None
+    return [code for code, _, info in iter_class_info() if info['risk_level'] in risk_levels]
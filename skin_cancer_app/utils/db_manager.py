@@ -1,139 +1,611 @@
 import sqlite3
 import os
+import re
+import queue
+import threading
 import streamlit as st
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
-# Database connection
-def get_connection():
-    conn = sqlite3.connect('data/patient_records.db')
+DB_PATH = os.path.join('data', 'patient_records.db')
+
+# Pragmas applied once to every pooled connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',       # Readers no longer block on a writer
+    'PRAGMA synchronous = NORMAL',     # Safe with WAL, avoids an fsync per commit
+    'PRAGMA cache_size = -32000',      # ~32 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',    # Map up to 256 MB of the file
+    'PRAGMA busy_timeout = 5000',      # Wait for locks instead of failing immediately
+    'PRAGMA temp_store = MEMORY'
+)
+
+# Bounded pool shared by every thread. Streamlit runs each rerun on a fresh
+# script thread, so connections are handed out per operation and returned to
+# the pool afterwards; pragmas are only applied when a connection is opened.
+POOL_SIZE = 8
+POOL_TIMEOUT_SECONDS = 30
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_pool_lock = threading.Lock()
+_pool_opened = 0
+
+def _open_connection():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    # Autocommit mode: transaction() issues BEGIN/COMMIT itself, so DDL is
+    # transactional too (the sqlite3 module would otherwise commit it implicitly)
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def _acquire_connection():
+    global _pool_opened
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        pass
+    with _pool_lock:
+        if _pool_opened < POOL_SIZE:
+            _pool_opened += 1
+            try:
+                return _open_connection()
+            except Exception:
+                _pool_opened -= 1
+                raise
+    # Pool exhausted: wait for another operation to return a connection
+    return _pool.get(timeout=POOL_TIMEOUT_SECONDS)
+
+# Database connection
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection for the duration of the with-block"""
+    conn = _acquire_connection()
+    try:
+        yield conn
+    finally:
+        _pool.put_nowait(conn)
+
+def close_connections():
+    """Close every idle pooled connection (new ones are opened on demand)"""
+    global _pool_opened
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+        with _pool_lock:
+            _pool_opened -= 1
+
+@contextmanager
+def transaction():
+    """Yield a cursor inside a transaction; commits on success and rolls back on error"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            yield cursor
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            cursor.close()
+
+@contextmanager
+def read_cursor():
+    """Yield a cursor for read-only queries on a pooled connection"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
 # Initialize database by creating necessary tables
 def init_db():
     create_tables()
 
+# Numbered schema migrations, applied in order and recorded in schema_version.
+# Never edit a released migration; append a new one instead.
+MIGRATIONS = [
+    (1, "Initial patients and detection_results tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            age INTEGER,
+            gender TEXT,
+            contact TEXT,
+            address TEXT,
+            medical_history TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS detection_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER,
+            image_path TEXT,
+            diagnosis TEXT,
+            confidence REAL,
+            lesion_location TEXT,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients(id)
+        )
+        '''
+    ]),
+    (2, "Indexes for history and patient listing queries", [
+        # Per-patient history: WHERE patient_id = ? ORDER BY created_at DESC
+        '''CREATE INDEX IF NOT EXISTS idx_detection_patient_created
+           ON detection_results (patient_id, created_at DESC, id DESC)''',
+        # All-patient history: ORDER BY created_at DESC
+        '''CREATE INDEX IF NOT EXISTS idx_detection_created
+           ON detection_results (created_at DESC, id DESC)''',
+        # Patient listing: ORDER BY created_at DESC
+        '''CREATE INDEX IF NOT EXISTS idx_patients_created
+           ON patients (created_at DESC, id DESC)''',
+        'ANALYZE'
+    ]),
+    (3, "Chat messages spilled from the in-session history buffer", [
+        '''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''CREATE INDEX IF NOT EXISTS idx_chat_messages_session
+           ON chat_messages (session_id, id)'''
+    ]),
+    (4, "Index image paths for upload blob reference counting", [
+        '''CREATE INDEX IF NOT EXISTS idx_detection_image_path
+           ON detection_results (image_path)'''
+    ]),
+    (5, "Full-text search over patients and detection notes", [
+        # External-content FTS5 tables: the text lives in the base tables, the
+        # triggers below keep the indexes in step with every insert/update/delete
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+            name, contact, address, medical_history,
+            content='patients', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON patients BEGIN
+            INSERT INTO patients_fts (rowid, name, contact, address, medical_history)
+            VALUES (new.id, new.name, new.contact, new.address, new.medical_history);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name, contact, address, medical_history)
+            VALUES ('delete', old.id, old.name, old.contact, old.address, old.medical_history);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name, contact, address, medical_history)
+            VALUES ('delete', old.id, old.name, old.contact, old.address, old.medical_history);
+            INSERT INTO patients_fts (rowid, name, contact, address, medical_history)
+            VALUES (new.id, new.name, new.contact, new.address, new.medical_history);
+        END''',
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS detection_notes_fts USING fts5(
+            notes, lesion_location,
+            content='detection_results', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )''',
+        '''CREATE TRIGGER IF NOT EXISTS detection_notes_fts_ai AFTER INSERT ON detection_results BEGIN
+            INSERT INTO detection_notes_fts (rowid, notes, lesion_location)
+            VALUES (new.id, new.notes, new.lesion_location);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS detection_notes_fts_ad AFTER DELETE ON detection_results BEGIN
+            INSERT INTO detection_notes_fts (detection_notes_fts, rowid, notes, lesion_location)
+            VALUES ('delete', old.id, old.notes, old.lesion_location);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS detection_notes_fts_au AFTER UPDATE ON detection_results BEGIN
+            INSERT INTO detection_notes_fts (detection_notes_fts, rowid, notes, lesion_location)
+            VALUES ('delete', old.id, old.notes, old.lesion_location);
+            INSERT INTO detection_notes_fts (rowid, notes, lesion_location)
+            VALUES (new.id, new.notes, new.lesion_location);
+        END''',
+        # Index rows that existed before this migration
+        "INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')",
+        "INSERT INTO detection_notes_fts (detection_notes_fts) VALUES ('rebuild')"
+    ]),
+]
+
+# Migrations that need an optional SQLite feature. Without it the migration is
+# recorded as skipped and callers fall back (see fts_enabled()).
+MIGRATION_REQUIREMENTS = {
+    5: lambda: fts5_available()
+}
+
+def get_schema_version():
+    """Return the highest applied migration number (0 for a fresh database)"""
+    with read_cursor() as cursor:
+        cursor.execute('SELECT MAX(version) FROM schema_version')
+        row = cursor.fetchone()
+    return row[0] or 0
+
+def apply_migrations():
+    """Apply any migrations newer than the recorded schema version"""
+    with transaction() as cursor:
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+    global _fts_enabled
+    current = get_schema_version()
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        requirement = MIGRATION_REQUIREMENTS.get(version)
+        if requirement is not None and not requirement():
+            print(f"Skipping migration {version} ({description}): not supported by this SQLite build")
+            statements, description = [], f"{description} (skipped)"
+        # Each migration and its version row commit or roll back together
+        # (schema changes included, see transaction())
+        with transaction() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+    _fts_enabled = None
+    return get_schema_version()
+
 # Create tables if they do not exist
 def create_tables():
-    os.makedirs('data', exist_ok=True)
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Create patients table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS patients (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        age INTEGER,
-        gender TEXT,
-        contact TEXT,
-        address TEXT,
-        medical_history TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create detection results table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS detection_results (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        patient_id INTEGER,
-        image_path TEXT,
-        diagnosis TEXT,
-        confidence REAL,
-        lesion_location TEXT,
-        notes TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (patient_id) REFERENCES patients(id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    apply_migrations()
 
 # Add a detection record
 def add_detection_record(patient_id, image_path, diagnosis, confidence, lesion_location, notes):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        '''INSERT INTO detection_results 
-           (patient_id, image_path, diagnosis, confidence, lesion_location, notes) 
-           VALUES (?, ?, ?, ?, ?, ?)''',
-        (patient_id, image_path, diagnosis, confidence, lesion_location, notes)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute(
+            '''INSERT INTO detection_results 
+               (patient_id, image_path, diagnosis, confidence, lesion_location, notes) 
+               VALUES (?, ?, ?, ?, ?, ?)''',
+            (patient_id, image_path, diagnosis, confidence, lesion_location, notes)
+        )
 
 # Patient management functions
 def add_patient(name, age, gender, contact, address, medical_history):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO patients (name, age, gender, contact, address, medical_history) VALUES (?, ?, ?, ?, ?, ?)',
-        (name, age, gender, contact, address, medical_history)
-    )
-    patient_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute(
+            'INSERT INTO patients (name, age, gender, contact, address, medical_history) VALUES (?, ?, ?, ?, ?, ?)',
+            (name, age, gender, contact, address, medical_history)
+        )
+        patient_id = cursor.lastrowid
     return patient_id
 
 def get_patient(patient_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM patients WHERE id = ?', (patient_id,))
-    patient = cursor.fetchone()
-    conn.close()
-    return patient
+    with read_cursor() as cursor:
+        cursor.execute('SELECT * FROM patients WHERE id = ?', (patient_id,))
+        return cursor.fetchone()
 
 def get_all_patients():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM patients ORDER BY created_at DESC')
-    patients = cursor.fetchall()
-    conn.close()
-    return patients
-
-def save_detection_result(patient_id, image_path, diagnosis, confidence, lesion_location, notes):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO detection_results (patient_id, image_path, diagnosis, confidence, lesion_location, notes) VALUES (?, ?, ?, ?, ?, ?)',
-        (patient_id, image_path, diagnosis, confidence, lesion_location, notes)
-    )
-    result_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with read_cursor() as cursor:
+        cursor.execute('SELECT * FROM patients ORDER BY created_at DESC')
+        return cursor.fetchall()
+
+def get_patients_page(cursor=None, page_size=25):
+    """Fetch one page of patients, newest first, by keyset on (created_at, id).
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    where = 'WHERE (created_at, id) < (?, ?)' if cursor else ''
+    with read_cursor() as cur:
+        cur.execute(f'''
+            SELECT * FROM patients
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', tuple(cursor or ()) + (page_size + 1,))
+        rows = cur.fetchall()
+
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        return rows, (last['created_at'], last['id'])
+    return rows, None
+
+def save_detection_result(patient_id, image_path, diagnosis, confidence, lesion_location, notes, embedding=None):
+    with transaction() as cursor:
+        cursor.execute(
+            'INSERT INTO detection_results (patient_id, image_path, diagnosis, confidence, lesion_location, notes) VALUES (?, ?, ?, ?, ?, ?)',
+            (patient_id, image_path, diagnosis, confidence, lesion_location, notes)
+        )
+        result_id = cursor.lastrowid
+
+    # Keep the similar-lesion index in step with the table
+    if embedding is not None:
+        from utils.embedding_store import get_embedding_store
+        try:
+            get_embedding_store().add(result_id, embedding)
+        except Exception as e:
+            print(f"Error indexing embedding: {e}")
     return result_id
 
+def get_detection_results_by_ids(result_ids):
+    """Fetch detection rows (with patient name) for the given ids, preserving their order"""
+    if not result_ids:
+        return []
+    placeholders = ', '.join('?' for _ in result_ids)
+    with read_cursor() as cursor:
+        cursor.execute(f'''
+            SELECT dr.*, p.name as patient_name
+            FROM detection_results dr
+            LEFT JOIN patients p ON dr.patient_id = p.id
+            WHERE dr.id IN ({placeholders})
+        ''', tuple(result_ids))
+        rows = {row['id']: row for row in cursor.fetchall()}
+    return [rows[i] for i in result_ids if i in rows]
+
 def get_patient_detection_history(patient_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'SELECT * FROM detection_results WHERE patient_id = ? ORDER BY created_at DESC',
-        (patient_id,)
-    )
-    history = cursor.fetchall()
-    conn.close()
-    return history
+    with read_cursor() as cursor:
+        cursor.execute(
+            'SELECT * FROM detection_results WHERE patient_id = ? ORDER BY created_at DESC',
+            (patient_id,)
+        )
+        return cursor.fetchall()
 
 def get_all_detection_history():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT dr.*, p.name as patient_name 
-        FROM detection_results dr
-        LEFT JOIN patients p ON dr.patient_id = p.id
-        ORDER BY dr.created_at DESC
-    ''')
-    history = cursor.fetchall()
-    conn.close()
-    return history
+    with read_cursor() as cursor:
+        cursor.execute('''
+            SELECT dr.*, p.name as patient_name 
+            FROM detection_results dr
+            LEFT JOIN patients p ON dr.patient_id = p.id
+            ORDER BY dr.created_at DESC
+        ''')
+        return cursor.fetchall()
+
+def get_detection_history_page(patient_id=None, patient_ids=None, diagnoses=None,
+                               date_from=None, date_to=None, notes_query=None, cursor=None, page_size=25):
+    """Fetch one page of detection history, newest first, with all filters applied in SQL.
+
+    notes_query is free text matched against notes and lesion location (prefix search).
+    cursor is the (created_at, id) of the last row of the previous page.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    clauses = []
+    params = []
+
+    if patient_id is not None:
+        clauses.append('dr.patient_id = ?')
+        params.append(patient_id)
+    if patient_ids:
+        clauses.append(f"dr.patient_id IN ({', '.join('?' for _ in patient_ids)})")
+        params.extend(patient_ids)
+    if diagnoses is not None:
+        # An explicit empty list (e.g. a risk filter matching no class) means no rows
+        if not diagnoses:
+            return [], None
+        clauses.append(f"dr.diagnosis IN ({', '.join('?' for _ in diagnoses)})")
+        params.extend(diagnoses)
+    if date_from:
+        clauses.append('dr.created_at >= ?')
+        params.append(date_from.isoformat())
+    if date_to:
+        clauses.append('dr.created_at < ?')
+        params.append((date_to + timedelta(days=1)).isoformat())
+    if notes_query:
+        if fts_enabled():
+            match = build_fts_query(notes_query)
+            if match is None:
+                return [], None
+            clauses.append('dr.id IN (SELECT rowid FROM detection_notes_fts WHERE detection_notes_fts MATCH ?)')
+            params.append(match)
+        else:
+            like, like_params = build_like_clause(notes_query, ('dr.notes', 'dr.lesion_location'))
+            if like is None:
+                return [], None
+            clauses.append(like)
+            params.extend(like_params)
+    if cursor:
+        clauses.append('(dr.created_at, dr.id) < (?, ?)')
+        params.extend(cursor)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    with read_cursor() as cur:
+        cur.execute(f'''
+            SELECT dr.*, p.name as patient_name
+            FROM detection_results dr
+            LEFT JOIN patients p ON dr.patient_id = p.id
+            {where}
+            ORDER BY dr.created_at DESC, dr.id DESC
+            LIMIT ?
+        ''', tuple(params) + (page_size + 1,))
+        rows = cur.fetchall()
+
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        return rows, (last['created_at'], last['id'])
+    return rows, None
+
+def iter_detection_history(page_size=500, **filters):
+    """Yield every detection row matching the filters, newest first, one keyset page at a time"""
+    cursor = None
+    while True:
+        rows, cursor = get_detection_history_page(cursor=cursor, page_size=page_size, **filters)
+        yield from rows
+        if cursor is None:
+            break
+
+def get_detection_diagnoses():
+    """Distinct diagnoses present in the detection history"""
+    with read_cursor() as cursor:
+        cursor.execute('SELECT DISTINCT diagnosis FROM detection_results WHERE diagnosis IS NOT NULL')
+        return [row[0] for row in cursor.fetchall()]
+
+# Full-text search
+_fts_enabled = None
+
+def fts5_available():
+    """Whether this SQLite build has the FTS5 extension"""
+    probe = sqlite3.connect(':memory:')
+    try:
+        probe.execute('CREATE VIRTUAL TABLE fts5_probe USING fts5(x)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        probe.close()
+
+def fts_enabled():
+    """Whether the FTS5 search tables exist and can be queried; searches use LIKE otherwise"""
+    global _fts_enabled
+    if _fts_enabled is None:
+        with read_cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'")
+            _fts_enabled = cursor.fetchone() is not None and fts5_available()
+    return _fts_enabled
+
+def build_like_clause(text, columns):
+    """SQL requiring every word of text to occur in one of columns, plus its params.
+
+    Returns (None, []) if text has no words.
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None, []
+    clauses = []
+    params = []
+    for word in words:
+        pattern = '%' + re.sub(r'([\\%_])', r'\\\1', word) + '%'
+        clauses.append('(' + ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ')')
+        params.extend([pattern] * len(columns))
+    return ' AND '.join(clauses), params
+
+def build_fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix, or None if it has no words"""
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    # Quoting keeps FTS5 operators and punctuation in user input from being parsed
+    return ' '.join(f'"{word}"*' for word in words)
+
+def search_patients(query, limit=50):
+    """Patients matching query in name, contact, address or medical history, best match first"""
+    if not fts_enabled():
+        return _search_patients_like(query, limit)
+    match = build_fts_query(query)
+    if match is None:
+        return []
+    with read_cursor() as cursor:
+        # bm25 column weights: a name hit counts far more than a history hit
+        cursor.execute('''
+            SELECT p.*, bm25(patients_fts, 10.0, 4.0, 1.0, 1.0) AS rank
+            FROM patients_fts
+            JOIN patients p ON p.id = patients_fts.rowid
+            WHERE patients_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (match, limit))
+        return cursor.fetchall()
+
+def _search_patients_like(query, limit):
+    """search_patients without FTS5: substring matches, name hits first"""
+    like, params = build_like_clause(query, ('name', 'contact', 'address', 'medical_history'))
+    if like is None:
+        return []
+    name_like, name_params = build_like_clause(query, ('name',))
+    with read_cursor() as cursor:
+        cursor.execute(f'''
+            SELECT * FROM patients
+            WHERE {like}
+            ORDER BY ({name_like}) DESC, name
+            LIMIT ?
+        ''', tuple(params) + tuple(name_params) + (limit,))
+        return cursor.fetchall()
+
+# Upload blob references
+def count_image_references(image_paths):
+    """Number of detection rows referencing each image path, as {path: count}"""
+    counts = dict.fromkeys(image_paths, 0)
+    if not counts:
+        return counts
+    paths = list(counts)
+    with read_cursor() as cursor:
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            cursor.execute(f'''
+                SELECT image_path, COUNT(*) FROM detection_results
+                WHERE image_path IN ({placeholders})
+                GROUP BY image_path
+            ''', tuple(chunk))
+            counts.update({row[0]: row[1] for row in cursor.fetchall()})
+    return counts
+
+def get_detection_ids_for_image(image_path):
+    """Ids of detection rows that reference image_path"""
+    with read_cursor() as cursor:
+        cursor.execute('SELECT id FROM detection_results WHERE image_path = ?', (image_path,))
+        return [row[0] for row in cursor.fetchall()]
+
+def replace_image_paths(path_map):
+    """Point detection rows at new image paths ({old path: new path}); returns rows changed"""
+    if not path_map:
+        return 0
+    with transaction() as cursor:
+        cursor.executemany(
+            'UPDATE detection_results SET image_path = ? WHERE image_path = ?',
+            [(new, old) for old, new in path_map.items()]
+        )
+        return cursor.rowcount
+
+# Chat history spill-over, capped per session and pruned by age
+CHAT_MAX_MESSAGES_PER_SESSION = 500
+CHAT_RETENTION_DAYS = 30
+
+def add_chat_messages(session_id, messages):
+    """Persist chat messages (dicts with role and content) for a session, oldest first.
+
+    Only the newest CHAT_MAX_MESSAGES_PER_SESSION messages of a session are kept.
+    """
+    if not messages:
+        return
+    with transaction() as cursor:
+        cursor.executemany(
+            'INSERT INTO chat_messages (session_id, role, content) VALUES (?, ?, ?)',
+            [(session_id, m["role"], m["content"]) for m in messages]
+        )
+        # Both lookups walk idx_chat_messages_session
+        cursor.execute('''
+            DELETE FROM chat_messages
+            WHERE session_id = ? AND id <= (
+                SELECT id FROM chat_messages WHERE session_id = ?
+                ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+        ''', (session_id, session_id, CHAT_MAX_MESSAGES_PER_SESSION))
+
+def prune_chat_messages(max_age_days=CHAT_RETENTION_DAYS):
+    """Delete spilled chat messages older than max_age_days; returns how many were removed"""
+    with transaction() as cursor:
+        # created_at is CURRENT_TIMESTAMP (UTC), so compare against SQLite's own clock
+        cursor.execute(
+            "DELETE FROM chat_messages WHERE created_at < datetime('now', ?)",
+            (f'-{int(max_age_days)} days',)
+        )
+        return cursor.rowcount
+
+def get_chat_messages(session_id, limit):
+    """Return the most recent `limit` stored messages for a session, oldest first"""
+    with read_cursor() as cursor:
+        cursor.execute(
+            'SELECT role, content FROM chat_messages WHERE session_id = ? ORDER BY id DESC LIMIT ?',
+            (session_id, limit)
+        )
+        rows = cursor.fetchall()
+    return [{"role": row["role"], "content": row["content"]} for row in reversed(rows)]
 
 # Update patient information
 def update_patient(patient_id, name=None, age=None, gender=None, contact=None, address=None, medical_history=None):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
     # Prepare the fields to update
     fields = []
     values = []
@@ -165,6 +637,5 @@ def update_patient(patient_id, name=None, age=None, gender=None, contact=None, a
     query = f'UPDATE patients SET {", ".join(fields)} WHERE id = ?'
     values.append(patient_id)
     
-    cursor.execute(query, tuple(values))
-    conn.commit()
-    conn.close()
+    with transaction() as cursor:
+        cursor.execute(query, tuple(values))
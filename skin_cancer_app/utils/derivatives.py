@@ -0,0 +1,83 @@
+import os
+import threading
+
+from PIL import Image, ImageOps, features
+
+from utils.blob_store import UPLOAD_DIR, IMAGE_EXTENSIONS
+
+# Downscaled copies of stored lesion images, written beside the original as
+# <stem>_<variant><ext>. UIs show these instead of decoding the full upload.
+DERIVATIVE_SIZES = {
+    'thumb': 320,
+    'preview': 1024
+}
+
+# WebP when Pillow was built with it, JPEG otherwise
+if features.check('webp'):
+    DERIVATIVE_FORMAT, DERIVATIVE_EXT = 'WEBP', '.webp'
+else:
+    DERIVATIVE_FORMAT, DERIVATIVE_EXT = 'JPEG', '.jpg'
+DERIVATIVE_QUALITY = 82
+
+def derivative_path(image_path, variant):
+    """Where the given variant of image_path is stored"""
+    return f"{os.path.splitext(image_path)[0]}_{variant}{DERIVATIVE_EXT}"
+
+def is_derivative(path):
+    stem = os.path.splitext(path)[0]
+    return any(stem.endswith(f"_{variant}") for variant in DERIVATIVE_SIZES)
+
+def generate_derivatives(image_path, variants=None):
+    """Write every missing derivative of image_path from a single decode; returns {variant: path}"""
+    variants = variants or list(DERIVATIVE_SIZES)
+    paths = {variant: derivative_path(image_path, variant) for variant in variants}
+    missing = sorted((v for v in variants if not os.path.exists(paths[v])),
+                     key=lambda v: DERIVATIVE_SIZES[v], reverse=True)
+    if not missing:
+        return paths
+
+    largest = DERIVATIVE_SIZES[missing[0]]
+    with Image.open(image_path) as img:
+        # Let the JPEG decoder scale down by a power of two while decoding
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+
+    # Largest first so each smaller variant is resized from the previous one
+    for variant in missing:
+        size = DERIVATIVE_SIZES[variant]
+        img.thumbnail((size, size), Image.LANCZOS)
+        tmp_path = f"{paths[variant]}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, format=DERIVATIVE_FORMAT, quality=DERIVATIVE_QUALITY)
+        os.replace(tmp_path, paths[variant])
+    return paths
+
+def get_derivative(image_path, variant):
+    """Path of a derivative to display for image_path, falling back to the original"""
+    path = derivative_path(image_path, variant)
+    if os.path.exists(path):
+        return path
+    try:
+        return generate_derivatives(image_path)[variant]
+    except Exception as e:
+        print(f"Error generating {variant} for {image_path}: {e}")
+        return image_path
+
+def iter_source_images(directory=UPLOAD_DIR):
+    """Original images (blobs and legacy flat uploads) under directory"""
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS and not is_derivative(filename):
+                yield os.path.join(dirpath, filename)
+
+def backfill_derivatives(directory=UPLOAD_DIR):
+    """Generate missing derivatives for every stored image; returns how many images were processed"""
+    processed = 0
+    for image_path in iter_source_images(directory):
+        if all(os.path.exists(derivative_path(image_path, v)) for v in DERIVATIVE_SIZES):
+            continue
+        try:
+            generate_derivatives(image_path)
+            processed += 1
+        except Exception as e:
+            print(f"Error generating derivatives for {image_path}: {e}")
+    return processed
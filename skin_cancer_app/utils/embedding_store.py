@@ -0,0 +1,221 @@
+import os
+import json
+import threading
+import numpy as np
+
+from utils.image_processor import FEATURE_DIM
+
+# On-disk location of the lesion embedding matrix
+EMBEDDINGS_DIR = os.path.join('data', 'embeddings')
+
+class EmbeddingStore:
+    """Persistent float32 embedding matrix with a random-projection LSH index.
+
+    Vectors are L2-normalized on insert and kept in a memory-mapped file, so
+    cosine similarity is a dot product. Each row is tied to a detection_results id;
+    adding an id that is already stored overwrites its vector.
+    Small stores are searched exactly; larger ones only score LSH candidates.
+    VGG pooled features are non-negative, so the hyperplanes are centred on the
+    mean stored vector; otherwise most vectors would fall on the same side.
+    """
+
+    def __init__(self, directory=EMBEDDINGS_DIR, dim=FEATURE_DIM, n_tables=4, n_bits=12,
+                 brute_force_limit=4096, seed=0):
+        self.directory = directory
+        self.dim = dim
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.brute_force_limit = brute_force_limit
+        self._lock = threading.Lock()
+
+        # Fixed seed so hashes stay stable across processes
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((n_tables * n_bits, dim)).astype(np.float32)
+        self._powers = (1 << np.arange(n_bits, dtype=np.int64))
+        self._offsets = np.zeros(n_tables * n_bits, dtype=np.float32)
+        self._indexed_count = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, 'meta.json')
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._ids_path = os.path.join(directory, 'ids.i64')
+        self._load()
+
+    def _load(self):
+        meta = {'count': 0, 'capacity': 0, 'dim': self.dim}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('dim') != self.dim:
+                raise ValueError(f"Embedding store has dim {meta.get('dim')}, expected {self.dim}")
+
+        self.count = meta['count']
+        self._open(max(meta['capacity'], 1024))
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Re-centre the hyperplanes on the current mean vector and rehash every row"""
+        self._buckets = [{} for _ in range(self.n_tables)]
+        self._id_to_row = {}
+        if self.count:
+            mean = np.asarray(self._vectors[:self.count]).mean(axis=0)
+            self._offsets = self._planes @ mean
+            self._index_rows(0, self.count)
+        self._indexed_count = self.count
+
+    def _open(self, capacity):
+        """(Re)open the memory maps with the given row capacity, growing the files if needed"""
+        for path, itemsize in ((self._vectors_path, 4 * self.dim), (self._ids_path, 8)):
+            size = capacity * itemsize
+            with open(path, 'ab') as f:
+                if f.tell() < size:
+                    f.truncate(size)
+        self.capacity = capacity
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self._ids = np.memmap(self._ids_path, dtype=np.int64, mode='r+', shape=(capacity,))
+
+    def _save_meta(self):
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'count': self.count, 'capacity': self.capacity, 'dim': self.dim}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _hash(self, vectors):
+        """LSH codes of shape (n_tables, n) for a (n, dim) matrix"""
+        bits = (vectors @ self._planes.T) > self._offsets
+        bits = bits.reshape(len(vectors), self.n_tables, self.n_bits)
+        return (bits @ self._powers).T
+
+    def _index_rows(self, start, stop):
+        self._index_row_list(range(start, stop))
+
+    def _index_row_list(self, rows):
+        rows = list(rows)
+        codes = self._hash(np.asarray(self._vectors[rows]))
+        for table, table_codes in zip(self._buckets, codes):
+            for row, code in zip(rows, table_codes.tolist()):
+                table.setdefault(code, []).append(row)
+        for row in rows:
+            self._id_to_row[int(self._ids[row])] = row
+
+    def _unindex_rows(self, rows):
+        codes = self._hash(np.asarray(self._vectors[rows]))
+        for table, table_codes in zip(self._buckets, codes):
+            for row, code in zip(rows, table_codes.tolist()):
+                bucket = table.get(code)
+                if bucket and row in bucket:
+                    bucket.remove(row)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, detection_id, embedding):
+        """Append one embedding for a detection_results row and index it"""
+        self.add_many([detection_id], [embedding])
+
+    def add_many(self, detection_ids, embeddings):
+        """Add several embeddings at once (used by backfill); known ids are overwritten"""
+        if len(detection_ids) == 0:
+            return
+        vectors = self._normalize(np.reshape(embeddings, (len(detection_ids), self.dim)))
+        # Last vector wins when an id appears more than once in the batch
+        latest = {int(i): n for n, i in enumerate(detection_ids)}
+
+        with self._lock:
+            existing = [(self._id_to_row[i], n) for i, n in latest.items() if i in self._id_to_row]
+            new = [(i, n) for i, n in latest.items() if i not in self._id_to_row]
+
+            if existing:
+                rows = [row for row, _ in existing]
+                self._unindex_rows(rows)
+                self._vectors[rows] = vectors[[n for _, n in existing]]
+                self._index_row_list(rows)
+
+            start, needed = self.count, self.count + len(new)
+            if needed > self.capacity:
+                self._vectors.flush()
+                self._ids.flush()
+                self._open(max(needed, self.capacity * 2))
+            if new:
+                self._vectors[start:needed] = vectors[[n for _, n in new]]
+                self._ids[start:needed] = np.asarray([i for i, _ in new], dtype=np.int64)
+            self._vectors.flush()
+            self._ids.flush()
+            self.count = needed
+            self._save_meta()
+
+            # Re-centre once the store has doubled since the last full index build
+            if self.count >= 2 * max(self._indexed_count, 1):
+                self._rebuild_index()
+            elif new:
+                self._index_rows(start, needed)
+
+    def __contains__(self, detection_id):
+        return int(detection_id) in self._id_to_row
+
+    def query(self, embedding, k=5, exclude_ids=()):
+        """Return up to k (detection_id, cosine similarity) pairs, most similar first"""
+        query = self._normalize(embedding).reshape(self.dim)
+        exclude = set(int(i) for i in exclude_ids)
+        with self._lock:
+            if self.count == 0:
+                return []
+
+            rows = None
+            if self.count > self.brute_force_limit:
+                codes = self._hash(query[None, :])[:, 0].tolist()
+                candidates = set()
+                for table, code in zip(self._buckets, codes):
+                    candidates.update(table.get(code, ()))
+                if len(candidates) >= k + len(exclude):
+                    rows = np.fromiter(candidates, dtype=np.int64)
+
+            if rows is None:
+                rows = np.arange(self.count)
+            scores = np.asarray(self._vectors[rows]) @ query
+            ids = np.asarray(self._ids[rows])
+
+        if exclude:
+            keep = ~np.isin(ids, list(exclude))
+            scores, ids = scores[keep], ids[keep]
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+# Process-wide store instance
+_embedding_store = None
+_embedding_store_lock = threading.Lock()
+
+def get_embedding_store():
+    """Get the shared embedding store, loading it from disk on first use"""
+    global _embedding_store
+    if _embedding_store is None:
+        with _embedding_store_lock:
+            if _embedding_store is None:
+                _embedding_store = EmbeddingStore()
+    return _embedding_store
+
+def backfill_embeddings(rows=None, batch_size=32):
+    """Embed and index detection rows (dicts/Rows with 'id' and 'image_path') missing from the store.
+
+    rows defaults to every saved detection.
+    """
+    from utils.image_processor import embed_images
+
+    if rows is None:
+        from utils.db_manager import iter_detection_history
+        rows = iter_detection_history()
+    store = get_embedding_store()
+    pending = [r for r in rows if r['id'] not in store and r['image_path'] and os.path.exists(r['image_path'])]
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        embeddings = embed_images([r['image_path'] for r in batch], batch_size=batch_size)
+        store.add_many([r['id'] for r in batch], embeddings)
+    return len(pending)
@@ -0,0 +1,133 @@
+import io
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Lightweight figure rendering with NumPy/PIL, used instead of matplotlib for
+# the analysis grid and confidence chart. Figures are returned as PNG bytes
+# that st.image can display directly.
+BACKGROUND = (255, 255, 255)
+TEXT_COLOR = (0, 0, 0)
+AXIS_COLOR = (80, 80, 80)
+PANEL_SIZE = (360, 360)
+TITLE_HEIGHT = 28
+
+@lru_cache(maxsize=8)
+def get_font(size=14):
+    """PIL's bundled font at the requested size (bitmap fallback on older Pillow)"""
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+def _text_size(draw, text, font):
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    return right - left, bottom - top
+
+def hot_colormap(values):
+    """Map floats in [0, 1] to RGB uint8 with the same ramps as matplotlib's 'hot'"""
+    values = np.clip(np.asarray(values, dtype=np.float32), 0.0, 1.0)
+    red = np.clip(values / 0.365, 0, 1)
+    green = np.clip((values - 0.365) / (0.746 - 0.365), 0, 1)
+    blue = np.clip((values - 0.746) / (1.0 - 0.746), 0, 1)
+    return (np.stack([red, green, blue], axis=-1) * 255).astype(np.uint8)
+
+def to_pil(array):
+    """uint8 grayscale or RGB array -> PIL image"""
+    array = np.asarray(array)
+    if array.dtype != np.uint8:
+        array = np.clip(array, 0, 255).astype(np.uint8)
+    return Image.fromarray(array, mode="L" if array.ndim == 2 else "RGB").convert("RGB")
+
+def fit_panel(image, size=PANEL_SIZE):
+    """Scale an image to fit inside size (keeping aspect ratio) and center it on a white panel"""
+    if isinstance(image, np.ndarray):
+        image = to_pil(image)
+    image = image.copy()
+    image.thumbnail(size, Image.BILINEAR)
+    panel = Image.new("RGB", size, BACKGROUND)
+    panel.paste(image, ((size[0] - image.width) // 2, (size[1] - image.height) // 2))
+    return panel
+
+def histogram_panel(values, bins=20, size=PANEL_SIZE, color=(135, 206, 235), edge=(0, 0, 0),
+                    xlabel="Feature Value", ylabel="Frequency"):
+    """Draw a histogram of values as a panel image"""
+    counts, _ = np.histogram(values, bins=bins)
+    panel = Image.new("RGB", size, BACKGROUND)
+    draw = ImageDraw.Draw(panel)
+    font = get_font(12)
+
+    left, bottom, right, top = 40, size[1] - 30, size[0] - 10, 10
+    draw.line([(left, top), (left, bottom), (right, bottom)], fill=AXIS_COLOR)
+
+    bar_width = (right - left) / len(counts)
+    scale = (bottom - top) / max(int(counts.max()), 1)
+    for i, count in enumerate(counts):
+        x0 = left + i * bar_width
+        draw.rectangle([x0, bottom - count * scale, x0 + bar_width, bottom], fill=color, outline=edge)
+
+    label_width, _ = _text_size(draw, xlabel, font)
+    draw.text(((left + right - label_width) / 2, bottom + 8), xlabel, fill=TEXT_COLOR, font=font)
+
+    # Vertical y-axis label
+    label_w, label_h = _text_size(draw, ylabel, font)
+    label = Image.new("RGB", (label_w + 2, label_h + 4), BACKGROUND)
+    ImageDraw.Draw(label).text((0, 0), ylabel, fill=TEXT_COLOR, font=font)
+    label = label.rotate(90, expand=True)
+    panel.paste(label, (4, int((top + bottom - label.height) / 2)))
+    return panel
+
+def compose_grid(panels, cols=2, panel_size=PANEL_SIZE):
+    """Lay out (title, panel image) pairs in a grid with a title above each panel"""
+    rows = (len(panels) + cols - 1) // cols
+    cell_w, cell_h = panel_size[0], panel_size[1] + TITLE_HEIGHT
+    figure = Image.new("RGB", (cols * cell_w, rows * cell_h), BACKGROUND)
+    draw = ImageDraw.Draw(figure)
+    font = get_font(16)
+
+    for index, (title, panel) in enumerate(panels):
+        x = (index % cols) * cell_w
+        y = (index // cols) * cell_h
+        title_width, _ = _text_size(draw, title, font)
+        draw.text((x + (cell_w - title_width) / 2, y + 6), title, fill=TEXT_COLOR, font=font)
+        figure.paste(fit_panel(panel, panel_size), (x, y + TITLE_HEIGHT))
+    return figure
+
+def bar_chart(labels, values, colors, title, size=(800, 420)):
+    """Horizontal bar chart with percentage labels, values in [0, 1]"""
+    figure = Image.new("RGB", size, BACKGROUND)
+    draw = ImageDraw.Draw(figure)
+    font = get_font(14)
+    title_font = get_font(18)
+
+    title_width, _ = _text_size(draw, title, title_font)
+    draw.text(((size[0] - title_width) / 2, 8), title, fill=TEXT_COLOR, font=title_font)
+
+    label_width = max(_text_size(draw, label, font)[0] for label in labels) + 12
+    left, right = label_width, size[0] - 70
+    top, bottom = 40, size[1] - 20
+    draw.line([(left, top), (left, bottom)], fill=AXIS_COLOR)
+
+    row_height = (bottom - top) / len(labels)
+    # First label at the bottom, like matplotlib's barh
+    for i, (label, value, color) in enumerate(zip(labels, values, colors)):
+        y_center = bottom - (i + 0.5) * row_height
+        bar_end = left + (right - left) * float(np.clip(value, 0, 1))
+        draw.rectangle([left, y_center - row_height * 0.4, bar_end, y_center + row_height * 0.4], fill=color)
+
+        text_w, text_h = _text_size(draw, label, font)
+        draw.text((left - text_w - 6, y_center - text_h / 2), label, fill=TEXT_COLOR, font=font)
+        value_text = f"{value:.1%}"
+        draw.text((bar_end + 4, y_center - text_h / 2), value_text, fill=TEXT_COLOR, font=font)
+    return figure
+
+def to_png_bytes(image):
+    """Encode a PIL image as PNG bytes (fast compression, the payload is short-lived)"""
+    buf = io.BytesIO()
+    image.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+def hex_to_rgb(color):
+    color = color.lstrip('#')
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
@@ -1,96 +1,235 @@
+import os
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import base64
+import threading
+from functools import cached_property
 from PIL import Image
+from utils.figure_renderer import compose_grid, to_png_bytes
 
-def get_image_features(image_path):
-    """Extract features from the skin lesion image using a pre-trained VGG16 model."""
-    # Read the image
-    img = cv2.imread(image_path)
-    
-    # Resize the image to 224x224 (VGG16 input size)
-    img_resized = cv2.resize(img, (224, 224))
-    
-    # Convert image to RGB
-    img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
-    
-    # Expand dimensions for model input
-    img_expanded = np.expand_dims(img_rgb, axis=0)
-    
-    # Preprocess the image for VGG16
-    img_preprocessed = preprocess_input(img_expanded)
-    
-    # Load pre-trained VGG16 model (include top layer)
-    model = VGG16(weights='imagenet', include_top=False)
-    
-    # Get features from the model
-    features = model.predict(img_preprocessed)
-    
-    # Flatten the features to a 1D array
-    flattened_features = features.flatten()
-    
-    return flattened_features
+# Longest side (pixels) of the working level that analysis runs on. Uploads are
+# decoded at reduced size and everything downstream stays at this resolution;
+# full resolution is only touched when a caller asks for it explicitly.
+WORKING_MAX_SIDE = int(os.environ.get('SKINSCAN_WORKING_MAX_SIDE', 1024))
+
+# JPEG DCT scaling factors OpenCV can decode at directly
+_REDUCED_READ_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+def read_image_size(image_path):
+    """(width, height) from the file header without decoding pixels, or None if unreadable"""
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except Exception:
+        return None
+
+def decode_reduced(image_path, max_side=WORKING_MAX_SIDE):
+    """Decode image_path as BGR with its longest side at most max_side.
+
+    Uses the decoder's reduced-size modes (JPEG DCT scaling) when the file is at
+    least twice as large as needed, so the full-resolution bitmap is never allocated.
+    """
+    flag = cv2.IMREAD_COLOR
+    size = read_image_size(image_path)
+    if size and max_side:
+        for factor, reduced_flag in _REDUCED_READ_FLAGS:
+            if max(size) // factor >= max_side:
+                flag = reduced_flag
+                break
+
+    img = cv2.imread(image_path, flag)
+    if img is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    return downscale(img, max_side)
+
+def downscale(img, max_side):
+    """Resize img (area interpolation) so its longest side is at most max_side"""
+    height, width = img.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return img
+    scale = max_side / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+class ImageContext:
+    """Decode an image once and lazily cache the arrays derived from it.
+
+    Every stage of the analysis (prediction, enhancement, segmentation,
+    plotting, features) accepts an ImageContext so the file is read a single time.
+    All derived arrays are at the working level (longest side <= max_side);
+    full_mask/full_contour map the segmentation back to the original resolution.
+    """
+
+    def __init__(self, image_path, model_size=(224, 224), max_side=WORKING_MAX_SIDE):
+        self.image_path = image_path
+        self.model_size = model_size
+        self.max_side = max_side
+        self._levels = {}
+
+    @cached_property
+    def bgr(self):
+        """BGR image at the working level"""
+        return decode_reduced(self.image_path, self.max_side)
+
+    @cached_property
+    def rgb(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def resized(self):
+        """RGB image at model input size"""
+        return cv2.resize(self.rgb, self.model_size, interpolation=cv2.INTER_AREA)
+
+    def level(self, max_side):
+        """RGB pyramid level no larger than max_side, derived from the working level"""
+        if max_side not in self._levels:
+            self._levels[max_side] = downscale(self.rgb, max_side)
+        return self._levels[max_side]
+
+    @cached_property
+    def full_shape(self):
+        """(height, width) of the original image, oriented like the working level"""
+        size = read_image_size(self.image_path)
+        height, width = self.bgr.shape[:2]
+        if size is None:
+            return height, width
+        full_w, full_h = size
+        # EXIF rotation is applied on decode but not reflected in the header size
+        if (full_w > full_h) != (width > height) and full_w != full_h:
+            full_w, full_h = full_h, full_w
+        return full_h, full_w
+
+    @cached_property
+    def scale(self):
+        """Factor from working-level coordinates to full-resolution coordinates"""
+        return max(self.full_shape) / max(self.bgr.shape[:2])
+
+    @cached_property
+    def equalized(self):
+        """RGB image with the luma channel histogram-equalized"""
+        img_yuv = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2YUV)
+        img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
+        return cv2.cvtColor(img_yuv, cv2.COLOR_YUV2RGB)
+
+    @cached_property
+    def contour(self):
+        """Largest contour of the Otsu-thresholded image, or None if nothing was found"""
+        blurred = cv2.GaussianBlur(self.gray, (5, 5), 0)
+        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return None
+        return max(contours, key=cv2.contourArea)
+
+    @cached_property
+    def mask(self):
+        """Filled mask of the lesion contour, or None if no lesion was found"""
+        if self.contour is None:
+            return None
+        mask = np.zeros(self.gray.shape, np.uint8)
+        cv2.drawContours(mask, [self.contour], 0, 255, -1)
+        return mask
+
+    def full_contour(self):
+        """Lesion contour in full-resolution pixel coordinates, or None"""
+        if self.contour is None:
+            return None
+        return np.round(self.contour * self.scale).astype(np.int32)
+
+    def full_mask(self):
+        """Lesion mask at full resolution (allocated on demand, not cached), or None"""
+        contour = self.full_contour()
+        if contour is None:
+            return None
+        mask = np.zeros(self.full_shape, np.uint8)
+        cv2.drawContours(mask, [contour], 0, 255, -1)
+        return mask
+
+def as_image_context(image):
+    """Accept either a file path or an existing ImageContext"""
+    if isinstance(image, ImageContext):
+        return image
+    return ImageContext(image)
+
+# Lazily built VGG16 extractor shared by every caller in the process
+FEATURE_DIM = 512
+_feature_extractor = None
+_feature_extractor_lock = threading.Lock()
+
+def get_feature_extractor():
+    """Build the VGG16 feature extractor once (global average pooled, 512-d output)"""
+    global _feature_extractor
+    if _feature_extractor is None:
+        with _feature_extractor_lock:
+            if _feature_extractor is None:
+                from tensorflow.keras.applications.vgg16 import VGG16
+                _feature_extractor = VGG16(weights='imagenet', include_top=False, pooling='avg')
+    return _feature_extractor
 
+def _to_vgg_input(image):
+    """Return a 224x224 RGB array for a path, ImageContext or RGB array.
+
+    ImageContexts reuse their cached decode and model-size resize.
+    """
+    if isinstance(image, np.ndarray):
+        return image if image.shape[:2] == (224, 224) else cv2.resize(image, (224, 224))
+    return as_image_context(image).resized
+
+def embed_images(images, batch_size=32):
+    """Embed a list of images (paths, ImageContexts or RGB arrays) as pooled float32 vectors.
+
+    Returns an array of shape (len(images), FEATURE_DIM).
+    """
+    from tensorflow.keras.applications.vgg16 import preprocess_input
+
+    if len(images) == 0:
+        return np.zeros((0, FEATURE_DIM), dtype=np.float32)
+
+    model = get_feature_extractor()
+    embeddings = []
+    for start in range(0, len(images), batch_size):
+        batch = np.stack([_to_vgg_input(img) for img in images[start:start + batch_size]]).astype(np.float32)
+        embeddings.append(model.predict(preprocess_input(batch), verbose=0))
+    return np.concatenate(embeddings).astype(np.float32)
+
+def get_image_features(image_path):
+    """Extract a pooled 512-d feature vector from the lesion image using a pre-trained VGG16 model."""
+    return embed_images([image_path])[0]
 
 def enhance_image(image_path):
     """Enhance the skin lesion image for better visualization"""
-    # Read the image
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    
-    # Apply histogram equalization to improve contrast
-    img_yuv = cv2.cvtColor(img, cv2.COLOR_RGB2YUV)
-    img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
-    enhanced_img = cv2.cvtColor(img_yuv, cv2.COLOR_YUV2RGB)
-    
-    return enhanced_img
+    # Histogram equalization on the luma channel improves contrast
+    return as_image_context(image_path).equalized
 
 def segment_lesion(image_path):
     """Segment the skin lesion from the background"""
-    # Read the image
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    
-    # Apply Gaussian blur to reduce noise
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # Thresholding to get binary image
-    _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    ctx = as_image_context(image_path)
+    img = ctx.rgb
     
-    # Find the largest contour (assumed to be the lesion)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    if not contours:
+    if ctx.mask is None:
         return img, img  # Return original if no contours found
     
-    # Find the largest contour
-    largest_contour = max(contours, key=cv2.contourArea)
-    
-    # Create mask and fill the largest contour
-    mask = np.zeros(thresh.shape, np.uint8)
-    cv2.drawContours(mask, [largest_contour], 0, 255, -1)
-    
     # Apply the mask to the original image
-    segmented = cv2.bitwise_and(img, img, mask=mask)
+    segmented = cv2.bitwise_and(img, img, mask=ctx.mask)
     
     # Create a version with highlighted contour
     highlighted = img.copy()
-    cv2.drawContours(highlighted, [largest_contour], 0, (0, 255, 0), 2)
+    cv2.drawContours(highlighted, [ctx.contour], 0, (0, 255, 0), 2)
     
     return segmented, highlighted
 
 def preprocess_image(image_path):
     """Preprocess the image for model input"""
-    # Read the image
-    img = cv2.imread(image_path)
-    
     # Resize the image to 224x224 (assuming the model requires this input size)
-    img_resized = cv2.resize(img, (224, 224))
+    img_resized = cv2.resize(as_image_context(image_path).bgr, (224, 224))
     
     # Normalize the image by scaling pixel values to [0, 1]
     img_normalized = img_resized.astype('float32') / 255.0
@@ -99,7 +238,7 @@ def preprocess_image(image_path):
 
 def augment_image(image_path):
     """Apply random augmentation techniques to the image"""
-    img = cv2.imread(image_path)
+    img = as_image_context(image_path).bgr
     
     # Flip the image horizontally
     flipped = cv2.flip(img, 1)
@@ -118,7 +257,7 @@ def augment_image(image_path):
 def crop_lesion(image_path):
     """Crop the lesion area from the image using segmentation"""
     # Segment the lesion
-    segmented, _ = segment_lesion(image_path)
+    segmented, _ = segment_lesion(as_image_context(image_path))
     
     # Convert the segmented image to grayscale
     gray = cv2.cvtColor(segmented, cv2.COLOR_RGB2GRAY)
@@ -137,50 +276,108 @@ def crop_lesion(image_path):
     
     return cropped_lesion
 
+# ABCD lesion features computed from the segmentation mask. Lengths and areas are
+# reported in full-resolution pixels even though the mask is at the working level.
+LESION_FEATURE_KEYS = (
+    'area', 'perimeter', 'circularity', 'asymmetry',
+    'border_irregularity', 'color_variegation', 'diameter'
+)
+
+def _mask_asymmetry(mask, moments):
+    """Mean XOR fraction of the mask folded over its two principal axes (0 = symmetric)"""
+    area = moments['m00']
+    cx, cy = moments['m10'] / area, moments['m01'] / area
+    angle = 0.5 * np.degrees(np.arctan2(2 * moments['mu11'], moments['mu20'] - moments['mu02']))
+
+    # Rotate so the major axis is horizontal, with the centroid at the canvas centre
+    ys, xs = np.nonzero(mask)
+    radius = int(np.ceil(np.sqrt(((xs - cx) ** 2 + (ys - cy) ** 2).max()))) + 1
+    size = 2 * radius + 1
+    M = cv2.getRotationMatrix2D((cx, cy), angle, 1.0)
+    M[:, 2] += (radius - cx, radius - cy)
+    aligned = cv2.warpAffine(mask, M, (size, size), flags=cv2.INTER_NEAREST)
+
+    aligned_area = max(cv2.countNonZero(aligned), 1)
+    across_major = cv2.countNonZero(cv2.bitwise_xor(aligned, cv2.flip(aligned, 0)))
+    across_minor = cv2.countNonZero(cv2.bitwise_xor(aligned, cv2.flip(aligned, 1)))
+    return (across_major + across_minor) / (2 * aligned_area)
+
+def lesion_features(image):
+    """Deterministic ABCD features of the segmented lesion (path or ImageContext).
+
+    Returns a dict with LESION_FEATURE_KEYS; all values are zero if no lesion was found.
+    """
+    ctx = as_image_context(image)
+    contour, mask = ctx.contour, ctx.mask
+    features = dict.fromkeys(LESION_FEATURE_KEYS, 0.0)
+    features['area'] = 0
+    if contour is None:
+        return features
+
+    moments = cv2.moments(mask, binaryImage=True)
+    if moments['m00'] == 0:
+        return features
+
+    scale = ctx.scale
+    area = moments['m00']
+    perimeter = cv2.arcLength(contour, True)
+    hull = cv2.convexHull(contour).reshape(-1, 2).astype(np.float32)
+    hull_perimeter = cv2.arcLength(hull, True)
+
+    # Greatest distance between any two hull points (maximum Feret diameter)
+    diameter = float(np.sqrt(((hull[:, None, :] - hull[None, :, :]) ** 2).sum(axis=-1).max()))
+
+    # Colour spread inside the lesion, mean channel standard deviation scaled to [0, 1]
+    _, stddev = cv2.meanStdDev(ctx.rgb, mask=mask)
+
+    features.update({
+        'area': int(round(area * scale ** 2)),
+        'perimeter': float(perimeter * scale),
+        'circularity': float(4 * np.pi * area / perimeter ** 2) if perimeter else 0.0,
+        'asymmetry': float(_mask_asymmetry(mask, moments)),
+        'border_irregularity': float(perimeter / hull_perimeter) if hull_perimeter else 0.0,
+        'color_variegation': float(stddev.mean() / 127.5),
+        'diameter': diameter * scale
+    })
+    return features
+
+def batch_lesion_features(images, max_workers=None):
+    """Lesion features for many images (paths or ImageContexts), in input order.
+
+    OpenCV releases the GIL, so images are processed on a thread pool. Images that
+    cannot be read yield None instead of aborting the batch.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def safe_features(image):
+        try:
+            return lesion_features(image)
+        except Exception as e:
+            print(f"Error extracting lesion features: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(safe_features, images))
+
 def create_analysis_plots(image_path):
     """Create analysis plots for the image"""
+    # Decode once and share the result across all panels
+    ctx = as_image_context(image_path)
+    
     # Original image
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = ctx.rgb
     
     # Enhanced image
-    enhanced = enhance_image(image_path)
+    enhanced = enhance_image(ctx)
     
     # Segmented image and contour
-    segmented, contour = segment_lesion(image_path)
-    
-    # Create figure with subplots
-    fig, axes = plt.subplots(2, 2, figsize=(10, 8))
-    
-    # Original
-    axes[0, 0].imshow(img)
-    axes[0, 0].set_title('Original Image')
-    axes[0, 0].axis('off')
-    
-    # Enhanced
-    axes[0, 1].imshow(enhanced)
-    axes[0, 1].set_title('Enhanced Image')
-    axes[0, 1].axis('off')
-    
-    # Segmented
-    axes[1, 0].imshow(segmented)
-    axes[1, 0].set_title('Segmented Lesion')
-    axes[1, 0].axis('off')
-    
-    # Contour
-    axes[1, 1].imshow(contour)
-    axes[1, 1].set_title('Lesion Boundary')
-    axes[1, 1].axis('off')
-    
-    # Tight layout
-    plt.tight_layout()
-    
-    # Convert plot to image
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
-    
-    # Encode to base64 for Streamlit
-    data = base64.b64encode(buf.read()).decode('utf-8')
-    return f"data:image/png;base64,{data}"
+    segmented, contour = segment_lesion(ctx)
+    
+    # Compose the 2x2 grid directly with PIL
+    figure = compose_grid([
+        ('Original Image', img),
+        ('Enhanced Image', enhanced),
+        ('Segmented Lesion', segmented),
+        ('Lesion Boundary', contour)
+    ])
+    return to_png_bytes(figure)
@@ -1,8 +1,13 @@
-import tensorflow as tf
 import numpy as np
 import cv2
 import os
-from tensorflow.keras.models import load_model
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from utils.image_processor import ImageContext, as_image_context
+
+DEFAULT_MODEL_PATH = 'models/skin_cancer_model.h5'
 
 # Define class names based on HAM10000 dataset
 SKIN_CLASSES = {
@@ -54,26 +59,116 @@ CLASS_INFO = {
     }
 }
 
+# Process-wide model registry shared by every session and SkinCancerModel instance.
+# Entries are keyed by (absolute path, file mtime) so a changed .h5 is reloaded.
+_model_registry = {}
+_model_stats = {}
+_registry_lock = threading.Lock()
+
+def _registry_key(model_path):
+    """Return the registry key for a model file, or None if it does not exist"""
+    abs_path = os.path.abspath(model_path)
+    try:
+        mtime = os.path.getmtime(abs_path)
+    except OSError:
+        return None
+    return abs_path, mtime
+
+def _model_memory_bytes(model):
+    """Approximate memory footprint of a model's weights in bytes"""
+    try:
+        return int(sum(w.nbytes for w in model.get_weights()))
+    except Exception:
+        return 0
+
+def get_shared_model(model_path=DEFAULT_MODEL_PATH):
+    """Return the process-wide model for model_path, loading it at most once per file version"""
+    key = _registry_key(model_path)
+    if key is None:
+        print(f"Error loading model: file not found at {model_path}")
+        return None
+
+    model = _model_registry.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        # Another thread may have loaded it while we waited for the lock
+        model = _model_registry.get(key)
+        if model is not None:
+            return model
+
+        # Drop stale versions of the same file (hot-reload)
+        for stale_key in [k for k in _model_registry if k[0] == key[0]]:
+            del _model_registry[stale_key]
+
+        try:
+            # TensorFlow is imported on first load, not when this module is imported
+            from tensorflow.keras.models import load_model
+            start = time.perf_counter()
+            model = load_model(key[0])
+            load_time = time.perf_counter() - start
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            return None
+
+        _model_registry[key] = model
+        _model_stats[key[0]] = {
+            'mtime': key[1],
+            'load_time_s': load_time,
+            'memory_bytes': _model_memory_bytes(model),
+            'loaded_at': time.time()
+        }
+        return model
+
+def warm_up_models(model_paths=(DEFAULT_MODEL_PATH,)):
+    """Load models into the registry and run one dummy forward pass so the first request is fast"""
+    loaded = []
+    for model_path in model_paths:
+        model = get_shared_model(model_path)
+        if model is None:
+            continue
+        stats = _model_stats.get(os.path.abspath(model_path), {})
+        if stats.get('warmed_up'):
+            loaded.append(model_path)
+            continue
+        try:
+            input_shape = model.input_shape[1:]
+            if None not in input_shape:
+                model.predict(np.zeros((1,) + tuple(input_shape), dtype=np.float32), verbose=0)
+            stats['warmed_up'] = True
+        except Exception as e:
+            print(f"Error warming up model: {e}")
+        loaded.append(model_path)
+    return loaded
+
+def get_model_stats():
+    """Return load time and memory footprint for every model currently in the registry"""
+    with _registry_lock:
+        return {path: dict(stats) for path, stats in _model_stats.items()}
+
+def clear_model_registry():
+    """Drop all cached models (mainly useful when freeing memory)"""
+    with _registry_lock:
+        _model_registry.clear()
+        _model_stats.clear()
+
 # Handle model loading and prediction
 class SkinCancerModel:
-    def __init__(self, model_path='models/skin_cancer_model.h5'):
+    def __init__(self, model_path=DEFAULT_MODEL_PATH):
         self.model = None
         self.model_path = model_path
         self.img_size = (224, 224)  # Standard size for many CNN models
     
     def load_model(self):
-        try:
-            self.model = load_model(self.model_path)
-            return True
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            return False
+        # Always go through the registry so a changed model file is picked up
+        self.model = get_shared_model(self.model_path)
+        return self.model is not None
     
     def preprocess_image(self, img_path):
-        # Read and preprocess the image
-        img = cv2.imread(img_path)
-        img = cv2.resize(img, self.img_size)
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        # Resized RGB image from the shared decode (accepts a path or ImageContext)
+        ctx = as_image_context(img_path)
+        img = ctx.resized if ctx.model_size == self.img_size else cv2.resize(ctx.rgb, self.img_size)
         
         # Normalize the image
         img = img / 255.0
@@ -82,28 +177,49 @@ class SkinCancerModel:
         img = np.expand_dims(img, axis=0)
         return img
     
-    def predict(self, img_path):
-        if self.model is None:
-            success = self.load_model()
-            if not success:
-                return None, None
-        
-        # Preprocess image
-        processed_img = self.preprocess_image(img_path)
-        
-        # Make prediction
-        predictions = self.model.predict(processed_img)
-        
-        # Get class with highest probability
-        predicted_class_index = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class_index])
-        
-        # Map index to class name
+    def _to_model_input(self, item):
+        """Turn an image path, ImageContext or RGB array into a normalized (H, W, 3) float32 array"""
+        if isinstance(item, ImageContext):
+            img = self.preprocess_image(item)[0]
+        elif isinstance(item, (str, os.PathLike)):
+            img = self.preprocess_image(str(item))[0]
+        else:
+            img = np.asarray(item)
+            if img.shape[:2] != self.img_size[::-1]:
+                img = cv2.resize(img, self.img_size)
+            if img.dtype == np.uint8:
+                img = img / 255.0
+        return img.astype(np.float32)
+
+    def _decode_predictions(self, predictions):
+        """Map raw model output rows to (class name, confidence) tuples"""
         class_keys = list(SKIN_CLASSES.keys())
-        predicted_class = class_keys[predicted_class_index]
-        
-        # Return class name and confidence
-        return predicted_class, confidence
+        indices = np.argmax(predictions, axis=1)
+        return [(class_keys[idx], float(row[idx])) for idx, row in zip(indices, predictions)]
+
+    def predict_arrays(self, arrays):
+        """Run one forward pass over already preprocessed arrays"""
+        if not self.load_model():
+            return [(None, None)] * len(arrays)
+        if len(arrays) == 0:
+            return []
+
+        batch = np.stack(arrays)
+        predictions = self.model.predict(batch, batch_size=len(batch), verbose=0)
+        return self._decode_predictions(predictions)
+
+    def predict_batch(self, paths_or_arrays):
+        """Predict a list of image paths and/or RGB arrays in a single forward pass"""
+        arrays = [self._to_model_input(item) for item in paths_or_arrays]
+        return self.predict_arrays(arrays)
+
+    def predict(self, img_path):
+        # Single image is just a batch of one
+        return self.predict_batch([img_path])[0]
+
+    def predict_async(self, img_path):
+        """Queue an image on the shared micro-batcher and return a Future of (class, confidence)"""
+        return get_micro_batcher(self.model_path).submit(img_path)
     
     def get_class_info(self, class_name):
         return {
@@ -113,4 +229,75 @@ class SkinCancerModel:
                 'risk_level': 'Unknown',
                 'recommendation': 'Please consult a medical professional'
             })
-        }
\ No newline at end of file
+        }
+
+# Micro-batching: gather concurrent requests from different sessions into one forward pass
+class MicroBatcher:
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, max_batch_size=16, max_wait_ms=20):
+        self.model = SkinCancerModel(model_path)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="skinscan-microbatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue an image path or array; the returned Future resolves to (class, confidence)"""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the deadline passes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Preprocess individually so one unreadable image does not fail the whole batch
+            arrays, futures = [], []
+            for item, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    arrays.append(self.model._to_model_input(item))
+                    futures.append(future)
+                except Exception as e:
+                    future.set_exception(e)
+
+            if not futures:
+                continue
+
+            try:
+                results = self.model.predict_arrays(arrays)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+def get_micro_batcher(model_path=DEFAULT_MODEL_PATH, max_batch_size=16, max_wait_ms=20):
+    """Return the process-wide micro-batcher for a model and batching settings, starting it on first use"""
+    key = (os.path.abspath(model_path), max_batch_size, max_wait_ms)
+    with _batchers_lock:
+        batcher = _batchers.get(key)
+        if batcher is None:
+            batcher = MicroBatcher(model_path, max_batch_size, max_wait_ms)
+            _batchers[key] = batcher
+        return batcher
@@ -0,0 +1,191 @@
+import io
+import os
+import zipfile
+import argparse
+import threading
+from datetime import datetime, date
+
+from fpdf import FPDF
+from PIL import Image
+
+from utils.result_cache import hash_image_file
+from utils.derivatives import get_derivative
+from utils.classes import resolve_class_info
+
+# Downscaled copies of lesion images embedded in reports
+REPORT_IMAGE_CACHE_DIR = os.path.join('data', 'cache', 'report_images')
+REPORT_IMAGE_MAX_PX = 600
+REPORT_IMAGE_WIDTH_MM = 80
+
+# Fonts per layout element: (family, style, size)
+REPORT_STYLES = {
+    "title": ("Arial", "B", 16),
+    "heading": ("Arial", "B", 14),
+    "label": ("Arial", "B", 12),
+    "text": ("Arial", "", 12)
+}
+
+# Report layout, built once at import. Each entry is (element, template, required field);
+# an entry is skipped when its required field is empty. Templates use str.format fields.
+REPORT_LAYOUT = (
+    ("title", "Skin Cancer Detection Report", None),
+    ("gap", 5, None),
+    ("text", "Date: {date}", None),
+    ("text", "Patient: {patient}", None),
+    ("gap", 5, None),
+    ("heading", "Diagnosis Results", None),
+    ("label", "Diagnosis: {diagnosis}", None),
+    ("text", "Confidence: {confidence:.1f}%", None),
+    ("text", "Risk Level: {risk_level}", None),
+    ("text", "Lesion Location: {lesion_location}", None),
+    ("gap", 5, None),
+    ("label", "Description:", None),
+    ("para", "{description}", None),
+    ("gap", 5, None),
+    ("label", "Recommendation:", None),
+    ("para", "{recommendation}", None),
+    ("gap", 5, None),
+    ("heading", "Lesion Features", "features"),
+    ("text", "Area: {features[area]} pixels", "features"),
+    ("text", "Perimeter: {features[perimeter]:.1f} pixels", "features"),
+    ("text", "Circularity: {features[circularity]:.3f}", "features"),
+    ("text", "Asymmetry Factor: {features[asymmetry]:.3f}", "features"),
+    ("text", "Border Irregularity: {features[border_irregularity]:.3f}", "features"),
+    ("text", "Colour Variegation: {features[color_variegation]:.3f}", "features"),
+    ("text", "Diameter: {features[diameter]:.1f} pixels", "features"),
+    ("gap", 5, "features"),
+    ("heading", "Notes", "notes"),
+    ("para", "{notes}", "notes"),
+    ("gap", 5, "notes"),
+    ("image", "Lesion Image", "image_path")
+)
+
+_report_images = {}
+_report_images_lock = threading.Lock()
+
+def get_report_image(image_path, max_px=REPORT_IMAGE_MAX_PX):
+    """Path of a downscaled JPEG copy of image_path, created once per image content and size"""
+    stat = os.stat(image_path)
+    memo_key = (os.path.abspath(image_path), stat.st_mtime, max_px)
+    cached = _report_images.get(memo_key)
+    if cached and os.path.exists(cached):
+        return cached
+
+    out_path = os.path.join(REPORT_IMAGE_CACHE_DIR, f"{hash_image_file(image_path)[:32]}_{max_px}.jpg")
+    if not os.path.exists(out_path):
+        os.makedirs(REPORT_IMAGE_CACHE_DIR, exist_ok=True)
+        # Start from the stored preview rather than decoding the full original
+        with Image.open(get_derivative(image_path, 'preview')) as img:
+            img = img.convert("RGB")
+            img.thumbnail((max_px, max_px))
+            tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, format="JPEG", quality=85)
+        os.replace(tmp_path, out_path)
+
+    with _report_images_lock:
+        _report_images[memo_key] = out_path
+    return out_path
+
+def build_report_data(patient, class_info, confidence, lesion_location, notes, image_path,
+                      features=None, report_date=None):
+    """Collect the fields used by REPORT_LAYOUT for one detection"""
+    return {
+        "date": report_date or datetime.now().strftime('%Y-%m-%d %H:%M'),
+        "patient": patient,
+        "diagnosis": class_info['name'],
+        "confidence": (confidence or 0) * 100,
+        "risk_level": class_info['info']['risk_level'],
+        "lesion_location": lesion_location or "N/A",
+        "description": class_info['info']['description'],
+        "recommendation": class_info['info']['recommendation'],
+        "features": features,
+        "notes": notes,
+        "image_path": image_path if image_path and os.path.exists(image_path) else None
+    }
+
+def _render_report_page(pdf, data):
+    """Add one report page to pdf by walking REPORT_LAYOUT"""
+    pdf.add_page()
+    for element, template, required in REPORT_LAYOUT:
+        if required and not data.get(required):
+            continue
+        if element == "gap":
+            pdf.ln(template)
+            continue
+        if element == "image":
+            # Skip the image if it cannot be read
+            try:
+                image_file = get_report_image(data["image_path"])
+            except Exception:
+                continue
+            pdf.set_font(*REPORT_STYLES["heading"])
+            pdf.cell(0, 10, template, ln=True)
+            pdf.image(image_file, x=None, y=None, w=REPORT_IMAGE_WIDTH_MM)
+            continue
+
+        text = template.format(**data)
+        if element == "para":
+            pdf.set_font(*REPORT_STYLES["text"])
+            pdf.multi_cell(0, 10, text)
+        else:
+            pdf.set_font(*REPORT_STYLES[element])
+            pdf.cell(0, 10, text, ln=True, align="C" if element == "title" else "")
+
+def render_reports_pdf(reports):
+    """Render one or more report data dicts into a single PDF and return its bytes"""
+    pdf = FPDF()
+    for data in reports:
+        _render_report_page(pdf, data)
+    return pdf.output(dest='S').encode('latin-1')
+
+def render_reports_zip(reports, names):
+    """Render each report to its own PDF and return a ZIP archive of them as bytes"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for data, name in zip(reports, names):
+            archive.writestr(name, render_reports_pdf([data]))
+    return buf.getvalue()
+
+def report_data_from_record(record):
+    """Report fields for a stored detection_results row (joined with patient_name)"""
+    patient = record['patient_name'] or "Unknown"
+    return build_report_data(
+        f"{patient} (ID: {record['patient_id']})",
+        resolve_class_info(record['diagnosis']),
+        record['confidence'],
+        record['lesion_location'],
+        record['notes'],
+        record['image_path'],
+        report_date=record['created_at']
+    )
+
+def export_reports(date_from=None, date_to=None, patient_ids=None, mode="zip"):
+    """Build reports for every detection in a date range without the UI.
+
+    mode="pdf" returns one multi-patient PDF, mode="zip" a ZIP with one PDF per detection.
+    """
+    from utils.db_manager import iter_detection_history
+
+    records = list(iter_detection_history(date_from=date_from, date_to=date_to, patient_ids=patient_ids))
+    reports = [report_data_from_record(r) for r in records]
+    if mode == "pdf":
+        return render_reports_pdf(reports)
+    names = [f"report_{r['id']}_patient_{r['patient_id']}.pdf" for r in records]
+    return render_reports_zip(reports, names)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export detection reports for a date range")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="First day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--patient", dest="patient_ids", type=int, action="append", help="Limit to a patient id (repeatable)")
+    parser.add_argument("--mode", choices=["zip", "pdf"], default="zip")
+    parser.add_argument("output", help="Output file path")
+    args = parser.parse_args()
+
+    data = export_reports(args.date_from, args.date_to, args.patient_ids, args.mode)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"Wrote {args.output} ({len(data)} bytes)")
+
+if __name__ == "__main__":
+    main()
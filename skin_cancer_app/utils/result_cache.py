@@ -0,0 +1,170 @@
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Default location and limits for cached analysis results
+CACHE_DIR = os.path.join('data', 'cache', 'results')
+MEMORY_LIMIT_BYTES = 64 * 1024 * 1024
+DISK_LIMIT_BYTES = 512 * 1024 * 1024
+
+def hash_bytes(data):
+    """SHA-256 hex digest of raw image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_image_file(image_path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of an image file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """Two-tier (memory LRU + disk) cache for analysis results.
+
+    Keys combine the image content hash, the model/pipeline version and the
+    name of the result, so identical uploads hit the cache and a new model
+    version never sees stale results.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_limit=MEMORY_LIMIT_BYTES, disk_limit=DISK_LIMIT_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Running size of the disk tier; None until the first directory scan
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_hash, version, name, *params):
+        """Build a cache key from the image hash, pipeline version, result name and extra params"""
+        raw = '|'.join([image_hash, str(version), name] + [repr(p) for p in params])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def _remember(self, key, payload):
+        """Store serialized payload in the memory tier, evicting least recently used entries"""
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= len(self._memory.pop(key))
+            if len(payload) > self.memory_limit:
+                return
+            self._memory[key] = payload
+            self._memory_bytes += len(payload)
+            while self._memory_bytes > self.memory_limit:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def get(self, key, default=None):
+        """Return a cached value, checking memory first and then disk"""
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+        if payload is None:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    payload = f.read()
+                os.utime(path)  # Mark as recently used for disk eviction
+            except OSError:
+                return default
+            self._remember(key, payload)
+        try:
+            return pickle.loads(payload)
+        except Exception:
+            return default
+
+    def set(self, key, value):
+        """Store a value in both tiers"""
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, payload)
+
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+
+            # Only walk the directory when the running total crosses the limit
+            with self._lock:
+                if self._disk_bytes is not None:
+                    self._disk_bytes += len(payload) - replaced
+                over_limit = self._disk_bytes is None or self._disk_bytes > self.disk_limit
+            if over_limit:
+                self.evict_disk()
+        except OSError as e:
+            print(f"Error writing result cache: {e}")
+
+    def get_or_compute(self, key, compute_fn):
+        """Return the cached value for key, computing and storing it on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute_fn()
+            self.set(key, value)
+        return value
+
+    def evict_disk(self):
+        """Delete least recently used files until the disk tier is under its size limit.
+
+        Evicts down to 90% of the limit so the next scan is many writes away.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        if total > self.disk_limit:
+            target = self.disk_limit * 0.9
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= target:
+                    break
+
+        with self._lock:
+            self._disk_bytes = total
+
+    def clear(self):
+        """Empty the memory tier (disk files are left for eviction)"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+# Process-wide cache instance
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+def get_result_cache():
+    """Get the shared result cache, creating it on first use"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
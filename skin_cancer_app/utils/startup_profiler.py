@@ -0,0 +1,89 @@
+import sys
+import time
+import builtins
+import threading
+
+# Startup profiler: times every first-time module import and named startup phases.
+# Enable with SKINSCAN_PROFILE_STARTUP=1; the report is shown in the sidebar.
+_original_import = None
+_process_start = time.perf_counter()
+_import_times = {}
+_marks = []
+_state = threading.local()
+_lock = threading.Lock()
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Fast path: already loaded absolute imports cost nothing worth recording
+    if level == 0 and name in sys.modules and not fromlist:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    stack = getattr(_state, 'stack', None)
+    if stack is None:
+        stack = _state.stack = []
+
+    before = set(sys.modules)
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        child_time = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+
+        if level == 0 and name not in before:
+            module_name = name
+        else:
+            # Relative or "from package import submodule": attribute to the newly loaded module
+            new_modules = set(sys.modules) - before
+            module_name = min(new_modules, key=len) if new_modules else None
+        if module_name and elapsed > 0:
+            with _lock:
+                if module_name not in _import_times:
+                    _import_times[module_name] = {
+                        'inclusive_s': elapsed,
+                        'self_s': max(elapsed - child_time, 0.0)
+                    }
+
+def install():
+    """Start timing imports (safe to call on every rerun)"""
+    global _original_import
+    if _original_import is None:
+        _original_import = builtins.__import__
+        builtins.__import__ = _timed_import
+
+def uninstall():
+    """Stop timing imports"""
+    global _original_import
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+        _original_import = None
+
+def is_installed():
+    return _original_import is not None
+
+def mark(label):
+    """Record a named phase (e.g. 'first paint') relative to process start, once per label"""
+    with _lock:
+        if not any(existing == label for existing, _ in _marks):
+            _marks.append((label, time.perf_counter() - _process_start))
+
+def get_import_report(top=25):
+    """Slowest first-time imports as (module, inclusive seconds, self seconds), slowest first"""
+    with _lock:
+        items = sorted(_import_times.items(), key=lambda item: item[1]['inclusive_s'], reverse=True)
+    return [(name, times['inclusive_s'], times['self_s']) for name, times in items[:top]]
+
+def get_marks():
+    """Named startup phases as (label, seconds since process start)"""
+    with _lock:
+        return list(_marks)
+
+def format_report(top=25):
+    """Plain-text report of phases and slowest imports"""
+    lines = [f"{label:<30} {seconds * 1000:9.1f} ms" for label, seconds in get_marks()]
+    lines.append(f"{'module':<40} {'inclusive':>12} {'self':>10}")
+    for name, inclusive, own in get_import_report(top):
+        lines.append(f"{name:<40} {inclusive * 1000:9.1f} ms {own * 1000:7.1f} ms")
+    return '\n'.join(lines)
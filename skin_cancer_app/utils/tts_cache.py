@@ -0,0 +1,109 @@
+import io
+import os
+import importlib.util
+import hashlib
+import tempfile
+import threading
+
+from utils.result_cache import ResultCache
+
+# Synthesized audio lives in its own result cache tier under data/audio
+AUDIO_CACHE_DIR = os.path.join('data', 'audio', 'cache')
+AUDIO_MEMORY_LIMIT_BYTES = 16 * 1024 * 1024
+AUDIO_DISK_LIMIT_BYTES = 128 * 1024 * 1024
+
+# Engine used when none is requested; override with SKINSCAN_TTS_ENGINE
+DEFAULT_TTS_ENGINE = os.environ.get('SKINSCAN_TTS_ENGINE', 'gtts')
+
+def _gtts_engine(text, lang, voice):
+    """Online Google TTS, rendered straight into memory (MP3)"""
+    import gtts
+
+    buf = io.BytesIO()
+    tts_kwargs = {'lang': lang}
+    if voice:
+        tts_kwargs['tld'] = voice  # gTTS picks the accent through the Google domain
+    gtts.gTTS(text, **tts_kwargs).write_to_fp(buf)
+    return buf.getvalue(), 'audio/mp3'
+
+def _pyttsx3_engine(text, lang, voice):
+    """Offline local TTS through pyttsx3 (WAV); optional, see requirements.txt"""
+    import pyttsx3
+
+    engine = pyttsx3.init()
+    if voice:
+        engine.setProperty('voice', voice)
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+        with open(path, 'rb') as f:
+            return f.read(), 'audio/wav'
+    finally:
+        os.remove(path)
+
+# name -> callable(text, lang, voice) returning (audio bytes, mime type)
+_tts_engines = {
+    'gtts': _gtts_engine
+}
+# pyttsx3 is an optional dependency; offer the engine only when it is installed
+if importlib.util.find_spec('pyttsx3') is not None:
+    _tts_engines['pyttsx3'] = _pyttsx3_engine
+
+def register_tts_engine(name, engine):
+    """Register a TTS engine: engine(text, lang, voice) -> (audio bytes, mime type)"""
+    _tts_engines[name] = engine
+
+def normalize_tts_text(text):
+    """Collapse whitespace so differently indented copies of a text share a cache entry"""
+    return ' '.join(text.split())
+
+class TTSCache:
+    """Synthesize speech once per (text, language, voice, engine) and serve cached bytes after that"""
+
+    def __init__(self, cache=None):
+        self.cache = cache or ResultCache(
+            cache_dir=AUDIO_CACHE_DIR,
+            memory_limit=AUDIO_MEMORY_LIMIT_BYTES,
+            disk_limit=AUDIO_DISK_LIMIT_BYTES
+        )
+
+    @staticmethod
+    def make_key(text, lang, voice, engine):
+        raw = '|'.join([normalize_tts_text(text), lang, voice or '', engine])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def synthesize(self, text, lang='en', voice=None, engine=None):
+        """Return (audio bytes, mime type), running the engine only on a cache miss"""
+        engine = engine or DEFAULT_TTS_ENGINE
+        if engine not in _tts_engines:
+            raise ValueError(f"Unknown or unavailable TTS engine: {engine}")
+        key = self.make_key(text, lang, voice, engine)
+        return self.cache.get_or_compute(
+            key, lambda: _tts_engines[engine](normalize_tts_text(text), lang, voice)
+        )
+
+    def prerender(self, texts, lang='en', voice=None, engine=None):
+        """Synthesize a list of texts ahead of time; returns how many succeeded"""
+        rendered = 0
+        for text in texts:
+            try:
+                self.synthesize(text, lang, voice, engine)
+                rendered += 1
+            except Exception as e:
+                print(f"Error pre-rendering audio: {e}")
+        return rendered
+
+# Process-wide TTS cache
+_tts_cache = None
+_tts_cache_lock = threading.Lock()
+
+def get_tts_cache():
+    """Get the shared TTS cache, creating it on first use"""
+    global _tts_cache
+    if _tts_cache is None:
+        with _tts_cache_lock:
+            if _tts_cache is None:
+                _tts_cache = TTSCache()
+    return _tts_cache